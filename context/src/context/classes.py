@@ -5,6 +5,7 @@ import javalang
 from javalang.tree import *
 from collections import defaultdict
 from ast import literal_eval
+from utils.profiler import profiler
 
 
 class ExtractorError(Exception):
@@ -29,7 +30,7 @@ def extractor_factory(extractor_value):
     elif extractor_value == Extractors.javadoc:
         return JavadocExtractor()
 
-    return NoneExtractor
+    return NoneExtractor()
 
 
 class ContextExtractor(ABC):
@@ -37,6 +38,10 @@ class ContextExtractor(ABC):
     def extract(self, masked_code, mask, file_content):
         pass
 
+    @abstractmethod
+    def extract_batch(self, file_content, examples):
+        pass
+
     @abstractmethod
     def baseline(self):
         pass
@@ -53,7 +58,8 @@ class ContextExtractor(ABC):
     def extract_method_signature(masked_code, mask):
         method_code = masked_code.replace('<extra_id_0>', mask)
         truncated = method_code.split('{')[0]
-        method_tree = javalang.parse.parse(f'class ParseC {{ {truncated} {{}} }}')
+        with profiler.stage('parse'):
+            method_tree = javalang.parse.parse(f'class ParseC {{ {truncated} {{}} }}')
         clazz = [n for _, n in method_tree.filter(ClassDeclaration)][0]
         if len(clazz.methods) > 0:
             method_signature = ContextExtractor.method_signature(clazz.methods[0])
@@ -73,10 +79,19 @@ class ContextExtractor(ABC):
         arguments = [p.type.name for p in node.parameters]
         return return_type, node.name, arguments
 
+    @staticmethod
+    def parse_classes(file_content):
+        with profiler.stage('parse'):
+            tree = javalang.parse.parse(file_content)
+        return [n for _, n in tree.filter(ClassDeclaration)]
+
     @staticmethod
     def extract_tree(file_content, *method_signature):
-        tree = javalang.parse.parse(file_content)
-        classes = [n for _, n in tree.filter(ClassDeclaration)]
+        classes = ContextExtractor.parse_classes(file_content)
+        return ContextExtractor.isolate_class(classes, *method_signature)
+
+    @staticmethod
+    def isolate_class(classes, *method_signature):
         if len(classes) == 1:
             return classes[0]
         for clazz in classes:
@@ -90,6 +105,32 @@ class ContextExtractor(ABC):
                     return clazz
         raise ExtractorError(f'Could not isolate class')
 
+    @staticmethod
+    def batch(file_content, examples, summarize, extract_from_class):
+        """
+        Parses the file and summarizes each of its classes only once for all the examples coming from it.
+        Yields one context per (masked_code, mask) example as soon as it is extracted, or the exception raised while
+        extracting it
+        """
+
+        try:
+            classes = ContextExtractor.parse_classes(file_content)
+        except Exception as e:
+            for _ in examples:
+                yield e
+            return
+
+        summaries = {}
+        for masked_code, mask in examples:
+            try:
+                method_signature = ContextExtractor.extract_method_signature(masked_code, mask)
+                clazz = ContextExtractor.isolate_class(classes, *method_signature)
+                if id(clazz) not in summaries:
+                    summaries[id(clazz)] = summarize(clazz)
+                yield extract_from_class(summaries[id(clazz)], masked_code, method_signature)
+            except Exception as e:
+                yield e
+
 
 class NoneExtractor(ContextExtractor, ABC):
     def __init__(self):
@@ -98,6 +139,9 @@ class NoneExtractor(ContextExtractor, ABC):
     def extract(self, masked_code, mask, file_content):
         return ''
 
+    def extract_batch(self, file_content, examples):
+        return ['' for _ in examples]
+
     def baseline(self):
         return ''
 
@@ -122,14 +166,33 @@ class InvokingSignatureExtractor(ContextExtractor, ABC):
         return True
 
     def extract(self, masked_code, mask, file_content):
-        method_return, method_name, method_args = ContextExtractor.extract_method_signature(masked_code, mask)
-        tree = ContextExtractor.extract_tree(file_content, method_return, method_name, method_args)
-        all_methods = InvokingSignatureExtractor.extract_all_methods(tree, method_name, method_args)
+        method_signature = ContextExtractor.extract_method_signature(masked_code, mask)
+        tree = ContextExtractor.extract_tree(file_content, *method_signature)
+        summary = InvokingSignatureExtractor.summarize(tree)
+        return InvokingSignatureExtractor.extract_from_class(summary, masked_code, method_signature)
 
-        used_methods, constructors = InvokingSignatureExtractor.extract_constructors(tree, method_name, method_args)
+    def extract_batch(self, file_content, examples):
+        return ContextExtractor.batch(file_content, examples, InvokingSignatureExtractor.summarize,
+                                      InvokingSignatureExtractor.extract_from_class)
+
+    @staticmethod
+    def summarize(tree):
+        # the parts of the class shared by all of its methods: signatures and the invocations inside each method
+        constructors = [ContextExtractor.constructor_signature(node) for node in tree.constructors]
+        methods = [ContextExtractor.method_signature(node) for node in tree.methods]
+        invocations = [set((i.member, len(i.arguments)) for _, i in node.filter(MethodInvocation))
+                       for node in tree.methods]
+        return constructors, methods, invocations
+
+    @staticmethod
+    def extract_from_class(summary, masked_code, method_signature):
+        method_return, method_name, method_args = method_signature
+        all_methods = InvokingSignatureExtractor.extract_all_methods(summary, method_name, method_args)
+
+        used_methods, constructors = InvokingSignatureExtractor.extract_constructors(summary, method_name, method_args)
         used_methods, invocations = InvokingSignatureExtractor.extract_inside(all_methods, used_methods, masked_code)
         used_methods, invocations = InvokingSignatureExtractor \
-            .extract_outside(tree, method_return, method_name, method_args, used_methods, invocations)
+            .extract_outside(summary, method_return, method_name, method_args, used_methods, invocations)
 
         all_methods = [InvokingSignatureExtractor.string_signature(*method) for method in all_methods]
         remaining_methods = ', '.join([m for m in all_methods if m not in used_methods])
@@ -141,22 +204,18 @@ class InvokingSignatureExtractor(ContextExtractor, ABC):
         return f'{return_type + " " if return_type else ""}{name}({", ".join(arguments)})'
 
     @staticmethod
-    def extract_all_methods(tree, method_name, method_args):
-        methods = []
-        for node in tree.constructors:
-            methods.append(ContextExtractor.constructor_signature(node))
-        for node in tree.methods:
-            methods.append(ContextExtractor.method_signature(node))
+    def extract_all_methods(summary, method_name, method_args):
+        constructors, methods, _ = summary
+        methods = constructors + methods
         return [m for m in methods if not (m[1] == method_name and m[2] == method_args)]
 
     @staticmethod
-    def extract_constructors(tree, method_name, method_args):
+    def extract_constructors(summary, method_name, method_args):
         constructors = []
-        for node in tree.constructors:
-            args = [p.type.name for p in node.parameters]
-            if node.name == method_name and args == method_args:
+        for _, name, args in summary[0]:
+            if name == method_name and args == method_args:
                 continue
-            constructors.append(f'{node.name}({", ".join(args)})')
+            constructors.append(f'{name}({", ".join(args)})')
         return constructors, ', '.join(constructors)
 
     @staticmethod
@@ -194,20 +253,18 @@ class InvokingSignatureExtractor(ContextExtractor, ABC):
         return used_methods, invocations
 
     @staticmethod
-    def extract_outside(tree, method_return, method_name, method_args, used_methods, invocations):
+    def extract_outside(summary, method_return, method_name, method_args, used_methods, invocations):
         method_signature = InvokingSignatureExtractor.string_signature(method_return, method_name, method_args)
+        _, methods, method_invocations = summary
 
-        for node in tree.methods:
-            return_type, name, args = ContextExtractor.method_signature(node)
+        for (return_type, name, args), invoked in zip(methods, method_invocations):
             signature = InvokingSignatureExtractor.string_signature(return_type, name, args)
             if signature in used_methods or signature == method_signature:
                 continue
 
-            for _, invocation in node.filter(MethodInvocation):
-                if invocation.member == method_name and len(invocation.arguments) == len(method_args):
-                    invocations.append(signature)
-                    used_methods.append(signature)
-                    break
+            if (method_name, len(method_args)) in invoked:
+                invocations.append(signature)
+                used_methods.append(signature)
 
         return used_methods, ', '.join(invocations)
 
@@ -228,20 +285,33 @@ class JavadocExtractor(ContextExtractor, ABC):
     def extract(self, masked_code, mask, file_content):
         method_signature = ContextExtractor.extract_method_signature(masked_code, mask)
         tree = ContextExtractor.extract_tree(file_content, *method_signature)
+        summary = JavadocExtractor.summarize(tree)
+        return JavadocExtractor.extract_from_class(summary, masked_code, method_signature)
 
-        if method_signature[0]:
-            methods = tree.methods
-            signature_extractor = ContextExtractor.method_signature
-        else:
-            methods = tree.constructors
-            signature_extractor = ContextExtractor.constructor_signature
+    def extract_batch(self, file_content, examples):
+        return ContextExtractor.batch(file_content, examples, JavadocExtractor.summarize,
+                                      JavadocExtractor.extract_from_class)
 
-        methods = [method for method in methods if signature_extractor(method) == method_signature]
+    @staticmethod
+    def summarize(tree):
+        # maps each signature of the class to the documentation of the methods/constructors having it
+        documentation = defaultdict(list)
+        for node in tree.methods:
+            return_type, name, args = ContextExtractor.method_signature(node)
+            documentation[(return_type, name, tuple(args))].append(node.documentation)
+        for node in tree.constructors:
+            return_type, name, args = ContextExtractor.constructor_signature(node)
+            documentation[(return_type, name, tuple(args))].append(node.documentation)
+        return documentation
+
+    @staticmethod
+    def extract_from_class(summary, masked_code, method_signature):
+        method_return, method_name, method_args = method_signature
+        methods = summary.get((method_return, method_name, tuple(method_args)), [])
         if len(methods) != 1:
             raise ExtractorError(f'Could not isolate method')
 
-        method = methods[0]
-        javadoc = method.documentation
+        javadoc = methods[0]
         if javadoc is None:
             raise ExtractorError(f'No javadoc found')
         return f'<SEP> {javadoc}'
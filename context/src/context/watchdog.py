@@ -0,0 +1,131 @@
+import os
+import sys
+from multiprocessing import Pipe, Process
+from javalang.tokenizer import LexerError
+from javalang.parser import JavaSyntaxError
+from context.classes import extractor_factory, ExtractorError
+
+
+class ExtractorTimeout(ExtractorError):
+    pass
+
+
+def worker(connection, recursion_limit):
+    if recursion_limit:
+        sys.setrecursionlimit(recursion_limit)
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+
+        extractor_value, file_content, examples = task
+        extractor = extractor_factory(extractor_value)
+
+        # each context is sent as soon as it is extracted, and exceptions are sent back as messages, since not all the
+        # javalang ones can be pickled
+        for context in extractor.extract_batch(file_content, examples):
+            if not isinstance(context, Exception):
+                connection.send((True, context))
+            elif isinstance(context, (ExtractorError, LexerError, JavaSyntaxError, RecursionError, IndexError)):
+                connection.send((False, str(context)))
+            else:
+                connection.send((None, str(context)))
+
+
+class Watchdog:
+    """
+    Runs the extractors in a separate worker process with a time and recursion budget.
+    On expiry (or if the worker dies) the worker is killed and replaced, and the file is added to the skip list, so
+    that the following runs do not wait for it again.
+    """
+
+    def __init__(self, timeout, recursion_limit=None, skip_list=None, max_tasks=10000):
+        self.timeout = timeout
+        self.recursion_limit = recursion_limit
+        self.skip_list = skip_list
+        self.max_tasks = max_tasks
+
+        self.process = None
+        self.connection = None
+        self.tasks = 0
+
+        self.skipped = set()
+        if skip_list and os.path.exists(skip_list):
+            with open(skip_list, 'r') as f:
+                self.skipped = set(line.strip() for line in f if line.strip())
+
+    def start(self):
+        self.connection, child_connection = Pipe()
+        self.process = Process(target=worker, args=(child_connection, self.recursion_limit), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.tasks = 0
+
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+        self.process = None
+
+    def close(self):
+        if self.process is not None:
+            self.connection.send(None)
+            self.process.join(timeout=5)
+        self.kill()
+
+    def skip(self, key):
+        self.skipped.add(key)
+        if self.skip_list:
+            with open(self.skip_list, 'a') as f:
+                f.write(f'{key}\n')
+
+    def extract_batch(self, extractor, file_content, examples, key):
+        """
+        Extracts the contexts of all the examples of a file, allowing `timeout` seconds for each of them, plus
+        `timeout` seconds for parsing the file, which is shared by all of them.
+        Returns one context per example, or the exception raised while extracting it. Once an example is over budget,
+        the file is skipped: the examples already extracted keep their context, the following ones get an
+        ExtractorTimeout
+        """
+
+        if not examples:
+            return []
+        if key in self.skipped:
+            return [ExtractorTimeout(f'{key} is in the skip list') for _ in examples]
+
+        # recycle the worker every now and then to release the memory retained by javalang
+        if self.process is None or self.tasks >= self.max_tasks:
+            self.kill()
+            self.start()
+
+        self.connection.send((extractor.value, file_content, examples))
+        self.tasks += len(examples)
+
+        contexts = []
+        budget = 2 * self.timeout  # the file is parsed before the first example
+        for _ in examples:
+            if not self.connection.poll(budget):
+                self.kill()
+                self.skip(key)
+                error = f'Extraction exceeded {self.timeout}s on {key}'
+                return contexts + [ExtractorTimeout(error) for _ in examples[len(contexts):]]
+
+            try:
+                status, result = self.connection.recv()
+            except EOFError:
+                # the worker died, most likely overflowing the C stack with a high recursion limit
+                self.kill()
+                self.skip(key)
+                return contexts + [ExtractorTimeout(f'Extraction crashed on {key}') for _ in examples[len(contexts):]]
+
+            if status:
+                contexts.append(result)
+            elif status is None:
+                contexts.append(Exception(result))
+            else:
+                contexts.append(ExtractorError(result))
+            budget = self.timeout
+
+        return contexts
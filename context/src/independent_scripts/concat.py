@@ -1,6 +1,9 @@
 import os
-import shutil
+import sys
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+BUFFER_SIZE = 1 << 22
 
 
 def create_directory_if_needed(path):
@@ -50,24 +53,74 @@ def CLI():
     return args
 
 
+def count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(BUFFER_SIZE), b''))
+
+
+def copy_file(source, target):
+    """
+    Appends the content of the source file descriptor to the target one, letting the kernel move the data when possible
+    """
+
+    size = os.fstat(source).st_size
+    copied = 0
+    try:
+        while copied < size:
+            if hasattr(os, 'copy_file_range'):
+                sent = os.copy_file_range(source, target, size - copied)
+            else:
+                sent = os.sendfile(target, source, None, size - copied)
+            if sent == 0:
+                break
+            copied += sent
+    except OSError:
+        # not supported between these file systems: fall back to a plain copy from where the kernel stopped
+        pass
+
+    os.lseek(source, copied, os.SEEK_SET)
+    while True:
+        block = os.read(source, BUFFER_SIZE)
+        if not block:
+            break
+        os.write(target, block)
+
+
+def concat_files(sources, target_path):
+    target = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for i, source_path in enumerate(sources):
+            source = os.open(source_path, os.O_RDONLY)
+            try:
+                copy_file(source, target)
+            finally:
+                os.close(source)
+            if i < len(sources) - 1:
+                os.write(target, b'\n')
+    finally:
+        os.close(target)
+
+
 def main():
     args = CLI()
     create_directory_if_needed(args.output)
 
-    with open(os.path.join(args.output, 'inputs.txt'), 'w') as inputs, \
-            open(os.path.join(args.output, 'targets.txt'), 'w') as targets:
-        for dataset in ['android', 'java']:
-            for level in ['block', 'construct', 'token']:
-                input_file = os.path.join(args.input, f'{dataset}_{level}_inputs')
-                target_file = os.path.join(args.input, f'{dataset}_{level}_targets')
-                with open(input_file) as i, open(target_file) as t:
-                    for line in i:
-                        inputs.write(line)
-                    for line in t:
-                        targets.write(line)
-                if not (dataset == 'java' and level == 'token'):
-                    inputs.write('\n')
-                    targets.write('\n')
+    names = [f'{dataset}_{level}' for dataset in ['android', 'java'] for level in ['block', 'construct', 'token']]
+    input_files = [os.path.join(args.input, f'{name}_inputs') for name in names]
+    target_files = [os.path.join(args.input, f'{name}_targets') for name in names]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        input_lines = executor.map(count_lines, input_files)
+        target_lines = executor.map(count_lines, target_files)
+        mismatches = [f'{name}: {i} inputs, {t} targets'
+                      for name, i, t in zip(names, input_lines, target_lines) if i != t]
+        if mismatches:
+            sys.exit('Inputs and targets do not match\n' + '\n'.join(mismatches))
+
+        copies = [executor.submit(concat_files, input_files, os.path.join(args.output, 'inputs.txt')),
+                  executor.submit(concat_files, target_files, os.path.join(args.output, 'targets.txt'))]
+        for copy in copies:
+            copy.result()
 
 
 if __name__ == '__main__':
@@ -1,8 +1,15 @@
 import os
 import re
-import shutil
 import pandas as pd
+from argparse import ArgumentParser
+from contextlib import nullcontext
+from multiprocessing import Pool
 from progress_bar import ProgressBar
+from parallel import ordered_map
+from counting import count_rows
+
+EXTRA_ID = re.compile(r'<extra_id_\d+>')
+CHUNK_SIZE = 50000
 
 
 def create_directory_if_needed(path):
@@ -10,40 +17,88 @@ def create_directory_if_needed(path):
         os.makedirs(path)
 
 
-def main():
-    df = pd.read_csv('data/language_dataset.tsv', sep='\t', header=None, names=['left', 'right'])
-    bar = ProgressBar(df)
+def CLI():
+    parser = ArgumentParser(description='Pre-training dataset reconstructor')
 
-    create_directory_if_needed('out')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='Number of processes reconstructing the chunks of the dataset')
+
+    args = parser.parse_args()
+    return args
+
+
+def reconstruct(left, right):
+    """
+    Merges the masked method (left) with its masked tokens (right)
+    Returns the method without whitespaces, whether it is one of the known badly formatted entries, and an error
+    message if the entry could not be reconstructed
+    """
+
+    if not isinstance(left, str) or not isinstance(right, str):
+        return None, False, 'missing column'
+
+    left = EXTRA_ID.split(left)
+    right = EXTRA_ID.split(right)
+
+    bad_format = False
+    if len(left) != (len(right) - 1):
+        if len(left) == 101 and len(right) == 101:
+            bad_format = True
+        else:
+            return None, False, f'{len(left)} code segments for {len(right)} masked segments'
 
+    method = ''.join([r + l for r, l in zip(right, left)]) + right[-1]
+    return ''.join(method.split()), bad_format, None
+
+
+def reconstruct_chunk(rows):
+    methods = []
     bad_format_count = 0
+    malformed = []
+    for idx, left, right in rows:
+        stripped, bad_format, error = reconstruct(left, right)
+        if error:
+            malformed.append((idx, error))
+            continue
+        bad_format_count += bad_format
+        methods.append(stripped)
+    return methods, bad_format_count, malformed, len(rows)
+
+
+def chunks(file_path):
+    reader = pd.read_csv(file_path, sep='\t', header=None, names=['left', 'right'], chunksize=CHUNK_SIZE)
+    for chunk in reader:
+        yield list(zip(chunk.index, chunk['left'], chunk['right']))
+
 
-    with open("out/extra_ids.txt", 'w') as f:
-        for idx, row in df.iterrows():
-            bar.update(f'bad format {bad_format_count}')
-            bar.next()
-            left, right = row['left'], row['right']
-            left = re.split(r'<extra_id_\d+>', left)
-            right = re.split(r'<extra_id_\d+>', right)
+def main():
+    args = CLI()
+    create_directory_if_needed('out')
+
+    bar = ProgressBar(count_rows('data/language_dataset.tsv'))
+    bad_format_count = 0
+    malformed_count = 0
 
-            if len(left) != (len(right) - 1):
-                if len(left) == 101 and len(right) == 101:
-                    bad_format_count += 1
-                else:
-                    print()
-                    print(f'Error at {idx}')
-                    exit()
+    # a single process reconstructs the chunks itself, without pickling them to a worker
+    workers = Pool(args.processes) if args.processes > 1 else nullcontext()
 
-            method = ''
-            for i in range(len(left)):
-                method += (right[i] + left[i])
-            method += right[-1]
+    with open('out/extra_ids.txt', 'w') as f, open('out/malformed_rows.txt', 'w') as f_malformed, workers as pool:
+        results = ordered_map(pool, reconstruct_chunk, chunks('data/language_dataset.tsv'), 2 * args.processes)
+        for methods, bad_format, malformed, size in results:
+            bad_format_count += bad_format
+            malformed_count += len(malformed)
 
-            stripped = ''.join(method.split())
+            if methods:
+                f.write('\n'.join(methods) + '\n')
+            for idx, error in malformed:
+                f_malformed.write(f'{idx}\t{error}\n')
 
-            f.write(stripped + '\n')
+            bar.update(f'bad format {bad_format_count}', f'malformed {malformed_count}')
+            bar.next(size)
 
     bar.finish()
+    if malformed_count:
+        print(f'{malformed_count} malformed rows were skipped, see out/malformed_rows.txt')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,169 @@
+import os
+import numpy as np
+import pandas as pd
+from itertools import islice
+from multiprocessing import Pool
+from argparse import ArgumentParser
+from numpy.lib.stride_tricks import sliding_window_view
+from normalization import squeeze_series
+from parallel import ordered_map
+from counting import count_rows
+from progress_bar import ProgressBar
+
+CHUNK_SIZE = 20000
+SHINGLE_SIZE = 8  # characters, so that a shingle fits exactly in 64 bits
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+SEED = 42
+
+# the permutations must be the same in every process, hence they are derived from a fixed seed
+rng = np.random.default_rng(SEED)
+MAX_PERM = 1024
+PERM_A = rng.integers(1, 1 << 31, size=MAX_PERM, dtype=np.uint64)
+PERM_B = rng.integers(0, 1 << 31, size=MAX_PERM, dtype=np.uint64)
+BAND_MULTIPLIERS = rng.integers(1, 1 << 62, size=MAX_PERM, dtype=np.uint64) | np.uint64(1)
+SHIFTS = np.arange(SHINGLE_SIZE, dtype=np.uint64) * np.uint64(8)
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def CLI():
+    parser = ArgumentParser(description='Near-duplicate detector between the pre-training and fine-tuning datasets')
+
+    parser.add_argument('-t', '--threshold', type=float, default=0.8,
+                        help='Minimum estimated Jaccard similarity of a near-duplicate pair')
+
+    parser.add_argument('-b', '--bands', type=int, default=16, help='Number of LSH bands')
+
+    parser.add_argument('-r', '--rows', type=int, default=8, help='Number of MinHash values in each band')
+
+    parser.add_argument('-m', '--max_bucket', type=int, default=1000,
+                        help='LSH buckets with more fine-tuning entries than this are ignored (boilerplate code)')
+
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count(),
+                        help='Number of processes computing the signatures')
+
+    args = parser.parse_args()
+    if args.bands * args.rows > MAX_PERM:
+        parser.error(f'bands * rows cannot exceed {MAX_PERM}')
+    return args
+
+
+def shingles(code):
+    data = np.frombuffer(code.encode('utf-8'), dtype=np.uint8)
+    if len(data) < SHINGLE_SIZE:
+        data = np.pad(data, (0, SHINGLE_SIZE - len(data)))
+
+    # pack each window of 8 characters in a 64-bit integer, then mix it down to 32 bits
+    windows = sliding_window_view(data, SHINGLE_SIZE).astype(np.uint64)
+    packed = np.bitwise_or.reduce(windows << SHIFTS, axis=1)
+    return np.unique((packed * GOLDEN) >> np.uint64(32))
+
+
+def signature(code, num_perm):
+    values = shingles(code)
+    hashed = (PERM_A[:num_perm, None] * values[None, :] + PERM_B[:num_perm, None]) % MERSENNE_PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def signatures(task):
+    keys, codes, num_perm = task
+    if not codes:
+        return keys, np.empty((0, num_perm), np.uint32)
+    return keys, np.stack([signature(code, num_perm) for code in codes])
+
+
+def band_keys(sigs, bands, rows):
+    sigs = sigs.reshape(len(sigs), bands, rows).astype(np.uint64)
+    return (sigs * BAND_MULTIPLIERS[:rows]).sum(axis=2)  # wraps around modulo 2^64
+
+
+def fine_tuning_chunks():
+    for chunk in pd.read_csv('data/main.csv', usecols=['ID', 'CODE', 'VALID'], chunksize=CHUNK_SIZE):
+        chunk = chunk[chunk['VALID'].astype(bool)]
+        yield chunk['ID'].to_numpy(), squeeze_series(chunk['CODE']).tolist()
+
+
+def language_chunks():
+    with open('data/extra_ids.txt', 'r') as f:
+        offset = 0
+        while True:
+            lines = [line.rstrip('\n') for line in islice(f, CHUNK_SIZE)]
+            if not lines:
+                break
+            yield np.arange(offset, offset + len(lines)), lines
+            offset += len(lines)
+
+
+class Index:
+    """
+    LSH index of the fine-tuning entries: for each band, the band keys are kept sorted next to the entry they belong
+    to, so that a lookup is a binary search and the whole index is a handful of numpy arrays
+    """
+
+    def __init__(self, ids, sigs, bands, rows, max_bucket):
+        self.ids = ids
+        self.sigs = sigs
+        self.max_bucket = max_bucket
+
+        keys = band_keys(sigs, bands, rows)
+        self.order = np.argsort(keys, axis=0, kind='stable')
+        self.keys = np.take_along_axis(keys, self.order, axis=0)
+
+    def candidates(self, query_keys):
+        queries, entries = [], []
+        for band in range(query_keys.shape[1]):
+            start = np.searchsorted(self.keys[:, band], query_keys[:, band], side='left')
+            end = np.searchsorted(self.keys[:, band], query_keys[:, band], side='right')
+            sizes = end - start
+            sizes[sizes > self.max_bucket] = 0
+
+            query = np.repeat(np.arange(len(query_keys)), sizes)
+            offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            queries.append(query)
+            entries.append(self.order[np.repeat(start, sizes) + offsets, band])
+
+        pairs = np.unique(np.stack([np.concatenate(queries), np.concatenate(entries)], axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+
+def main():
+    args = CLI()
+    num_perm = args.bands * args.rows
+
+    window = 2 * args.processes
+
+    with Pool(args.processes) as pool:
+        ids, sigs = [], []
+        chunks = ((chunk_ids, codes, num_perm) for chunk_ids, codes in fine_tuning_chunks())
+        for chunk_ids, chunk_sigs in ordered_map(pool, signatures, chunks, window):
+            ids.append(chunk_ids)
+            sigs.append(chunk_sigs)
+        index = Index(np.concatenate(ids), np.concatenate(sigs), args.bands, args.rows, args.max_bucket)
+        print(f'Indexed {len(index.ids)} fine-tuning entries')
+
+        chunks = ((line_numbers, codes, num_perm) for line_numbers, codes in language_chunks())
+        duplicates = set()
+        bar = ProgressBar(count_rows('data/extra_ids.txt'), 'Processing pre-training entries')
+
+        with open('out/near_duplicates.csv', 'w') as f:
+            f.write('id,language_line,jaccard\n')
+            for line_numbers, query_sigs in ordered_map(pool, signatures, chunks, window):
+                queries, entries = index.candidates(band_keys(query_sigs, args.bands, args.rows))
+                jaccard = (query_sigs[queries] == index.sigs[entries]).mean(axis=1)
+
+                similar = jaccard >= args.threshold
+                matched_ids = index.ids[entries[similar]]
+                for idx, line, score in zip(matched_ids, line_numbers[queries[similar]], jaccard[similar]):
+                    f.write(f'{idx},{line},{score:.3f}\n')
+                duplicates.update(matched_ids.tolist())
+
+                bar.update(f'near-duplicates {len(duplicates)}')
+                bar.next(len(line_numbers))
+    bar.finish()
+
+    with open('out/near_duplicate_ids.txt', 'w') as f:
+        for idx in sorted(duplicates):
+            f.write(f'{idx}\n')
+
+
+if __name__ == '__main__':
+    main()
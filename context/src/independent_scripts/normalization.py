@@ -0,0 +1,18 @@
+import re
+
+# whitespace and escaped new lines/tabs ('\n', '\t' written as two characters) are collapsed in a single pass
+FLATTEN_PATTERN = re.compile(r'(?:\s|\\[nt])+')
+
+
+def flatten(string):
+    return FLATTEN_PATTERN.sub(' ', string.strip())
+
+
+def flatten_series(series):
+    # the compiled pattern keeps Python's regex semantics also on Arrow-backed string columns
+    return series.str.strip().str.replace(FLATTEN_PATTERN, ' ', regex=True)
+
+
+def squeeze_series(series):
+    # same as ''.join(flatten(string).split()) on each element
+    return series.str.replace(FLATTEN_PATTERN, '', regex=True)
@@ -0,0 +1,18 @@
+from collections import deque
+
+
+def ordered_map(pool, function, tasks, window):
+    # like Pool.imap, but never reads more than `window` tasks ahead, so memory stays bounded on huge inputs
+    # without a pool, the tasks are processed one at a time in this process
+    if pool is None:
+        for task in tasks:
+            yield function(task)
+        return
+
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(function, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
@@ -1,41 +1,61 @@
-import sys
-import re
+import os
+import numpy as np
 import pandas as pd
+from itertools import islice
+from pandas.util import hash_pandas_object
+from normalization import squeeze_series
 from progress_bar import ProgressBar
 
+CHUNK_SIZE = 500000
 
-def flatten(string):
-    string = string.strip()
-    string = string.replace('\n', ' ')
-    string = string.replace('\\n', ' ')
-    string = string.replace('\t', ' ')
-    string = string.replace('\\t', ' ')
-    string = re.sub('\\s+', ' ', string)
-    return string
 
+def digest(series):
+    # 64-bit digest of each string: with a few million entries the chance of a collision is negligible
+    return hash_pandas_object(series.astype(object), index=False).to_numpy()
 
-def main():
-    with open('data/extra_ids.txt', 'r') as f:
-        language_entries = set(f.read().splitlines())
 
-    df = pd.read_csv('data/main.csv', usecols=['ID', 'CODE', 'VALID'])
-    df = df.set_index('ID')
+def language_digests(path):
+    digests = [np.empty(0, dtype=np.uint64)]
+    with open(path, 'r') as f:
+        while True:
+            lines = list(islice(f, CHUNK_SIZE))
+            if not lines:
+                break
+            digests.append(digest(pd.Series(lines).str.rstrip('\n')))
+
+    # sorted and without duplicates, ready for binary search
+    return np.unique(np.concatenate(digests))
+
 
-    bar = ProgressBar(df)
+def contains(sorted_digests, digests):
+    if len(sorted_digests) == 0:
+        return np.zeros(len(digests), dtype=bool)
+    positions = np.searchsorted(sorted_digests, digests)
+    positions = np.minimum(positions, len(sorted_digests) - 1)
+    return sorted_digests[positions] == digests
 
+
+def main():
+    language_entries = language_digests('data/extra_ids.txt')
+
+    processed = 0
     skip_count = 0
 
-    with open('out/shared_entries.txt', 'w') as f:
-        for idx, row in df.iterrows():
-            bar.update(f'skipping {skip_count}')
-            bar.next()
-            if row['VALID']:
-                code = flatten(row['CODE'])
-                stripped = ''.join(code.split())
-
-                if stripped in language_entries:
-                    f.write(f'{idx}\n')
-                    skip_count += 1
+    # the code can span several lines, so the progress is measured in bytes of main.csv
+    bar = ProgressBar(os.path.getsize('data/main.csv'), 'Processing main.csv (bytes)')
+
+    with open('data/main.csv', 'rb') as csv_file, open('out/shared_entries.txt', 'w') as f:
+        for chunk in pd.read_csv(csv_file, usecols=['ID', 'CODE', 'VALID'], chunksize=CHUNK_SIZE):
+            processed += len(chunk)
+            chunk = chunk[chunk['VALID'].astype(bool)]
+
+            shared = chunk['ID'].to_numpy()[contains(language_entries, digest(squeeze_series(chunk['CODE'])))]
+            if len(shared) > 0:
+                f.write('\n'.join(str(idx) for idx in shared) + '\n')
+            skip_count += len(shared)
+
+            bar.update(f'entries {processed}', f'shared {skip_count}')
+            bar.next(csv_file.tell() - bar.count)
 
     bar.finish()
 
@@ -1,5 +1,12 @@
 import os
+import shutil
+import hashlib
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+BUFFER_SIZE = 1 << 22
+EVAL_SHARE = 0.1
+TEST_SHARE = 0.1
 
 
 def CLI():
@@ -11,6 +18,12 @@ def CLI():
 
     parser.add_argument('-i', '--ids_dir', type=str, required=False, help='Directory with ids files')
 
+    parser.add_argument('-w', '--write_ids', action='store_true',
+                        help='Also write the ids of each split (not needed to reproduce the split)')
+
+    parser.add_argument('-x', '--exclude', type=str, required=False,
+                        help='File with the ids to leave out of every split (e.g. out/near_duplicate_ids.txt)')
+
     args = parser.parse_args()
     return args
 
@@ -25,17 +38,7 @@ def merge_files():
             for dataset in datasets:
                 for scope in scopes:
                     with open(f'merge_datasets/{scope}_{dataset}_{level}.tsv') as f_in:
-                        for line in f_in:
-                            f_out.write(line)
-
-
-def count_lines(file_path):
-    count = 0
-    with open(file_path) as f:
-        for line in f:
-            if line.strip():
-                count += 1
-    return count
+                        shutil.copyfileobj(f_in, f_out, BUFFER_SIZE)
 
 
 def out_ids(name, ids):
@@ -44,63 +47,77 @@ def out_ids(name, ids):
             f.write(f'{idx}\n')
 
 
+def split_of(idx):
+    """
+    Assigns an id to a split by hashing it, so that the same id always ends up in the same split (across levels, runs
+    and machines) without having to store the ids of each split
+    """
+
+    value = int.from_bytes(hashlib.blake2b(idx.encode(), digest_size=8).digest(), 'little') / 2 ** 64
+    if value < EVAL_SHARE:
+        return 'eval'
+    elif value < EVAL_SHARE + TEST_SHARE:
+        return 'test'
+    return 'train'
+
+
+def read_ids(ids_dir):
+    # a single lookup per row: the eval ids take precedence, as they did when checked first
+    ids = {}
+    for split in ['train', 'test', 'eval']:
+        with open(os.path.join(ids_dir, f'{split}.txt')) as f:
+            for line in f:
+                ids[line.strip()] = split
+    return ids
+
+
+def split_level(level, ids, excluded_ids, collect_ids):
+    assigned = {'eval': [], 'test': [], 'train': []}
+
+    with open(f'merge_datasets/{level}.tsv', buffering=BUFFER_SIZE) as f_in, \
+            open(f'out/{level}_eval.tsv', 'w', buffering=BUFFER_SIZE) as f_eval, \
+            open(f'out/{level}_test.tsv', 'w', buffering=BUFFER_SIZE) as f_test, \
+            open(f'out/{level}_train.tsv', 'w', buffering=BUFFER_SIZE) as f_train:
+        outputs = {'eval': f_eval, 'test': f_test, 'train': f_train}
+
+        for line in f_in:
+            if not line.strip():
+                continue
+
+            row = line.split('\t')
+            idx = row[0]
+            if idx in excluded_ids:
+                continue
+
+            split = ids.get(idx) if ids is not None else split_of(idx)
+            if split is None:
+                continue
+
+            outputs[split].write(f'{row[1]}\t{row[2]}')
+            if collect_ids:
+                assigned[split].append(idx)
+
+    return assigned
+
+
 def split_files(args):
     levels = ['token', 'block', 'construct']
 
-    if args.ids_dir:
-        with open(os.path.join(args.ids_dir, 'eval.txt')) as f_eval, \
-                open(os.path.join(args.ids_dir, 'train.txt')) as f_train, \
-                open(os.path.join(args.ids_dir, 'test.txt')) as f_test:
-            eval_ids = set([line.strip() for line in f_eval])
-            train_ids = set([line.strip() for line in f_train])
-            test_ids = set([line.strip() for line in f_test])
-    else:
-        eval_ids = set()
-        test_ids = set()
-        train_ids = set()
+    ids = read_ids(args.ids_dir) if args.ids_dir else None
 
-    for level in levels:
-        total_size = count_lines(f'merge_datasets/{level}.tsv')
-        eval_count = 0
-        test_count = 0
-        size = int(total_size * 0.1)
-
-        with open(f'merge_datasets/{level}.tsv') as f_in, \
-                open(f'out/{level}_eval.tsv', 'w') as f_eval, \
-                open(f'out/{level}_test.tsv', 'w') as f_test, \
-                open(f'out/{level}_train.tsv', 'w') as f_train:
-
-            for line in f_in:
-                row = line.split('\t')
-                idx = row[0]
-                entry = f'{row[1]}\t{row[2]}'
-
-                if idx in eval_ids:
-                    f_eval.write(entry)
-                    eval_count += 1
-                elif idx in test_ids:
-                    f_test.write(entry)
-                    test_count += 1
-                elif idx in train_ids:
-                    f_train.write(entry)
-
-                if not args.ids_dir:
-                    if eval_count < size:
-                        f_eval.write(entry)
-                        eval_count += 1
-                        eval_ids.add(idx)
-                    elif test_count < size:
-                        f_test.write(entry)
-                        test_count += 1
-                        test_ids.add(idx)
-                    else:
-                        f_train.write(entry)
-                        train_ids.add(idx)
-
-    if not args.ids_dir:
-        out_ids('eval', eval_ids)
-        out_ids('test', test_ids)
-        out_ids('train', train_ids)
+    excluded_ids = set()
+    if args.exclude:
+        with open(args.exclude) as f_exclude:
+            excluded_ids = set([line.strip() for line in f_exclude])
+
+    collect_ids = args.write_ids and not args.ids_dir
+    with ProcessPoolExecutor(max_workers=len(levels)) as executor:
+        futures = [executor.submit(split_level, level, ids, excluded_ids, collect_ids) for level in levels]
+        results = [future.result() for future in futures]
+
+    if collect_ids:
+        for split in ['eval', 'test', 'train']:
+            out_ids(split, set(idx for assigned in results for idx in assigned[split]))
 
 
 def main():
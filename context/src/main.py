@@ -1,27 +1,19 @@
 import os
-import re
 import pandas as pd
 from javalang.tokenizer import LexerError
 from javalang.parser import JavaSyntaxError
 from context.context import extract_file_content, delete_directory
 from context.classes import extractor_factory, ExtractorError, Extractors
 from context.dataset import Dataset
+from context.watchdog import Watchdog
 from utils.time import *
 from utils.parsing import *
 from utils.cli import CLI
 from utils.file_system import create_directory_if_needed
-from datetime import datetime
-from progress.bar import Bar
-
-
-def flatten(string):
-    string = string.strip()
-    string = string.replace('\n', ' ')
-    string = string.replace('\\n', ' ')
-    string = string.replace('\t', ' ')
-    string = string.replace('\\t', ' ')
-    string = re.sub('\\s+', ' ', string)
-    return string
+from utils.profiler import profiler
+from utils.checkpoint import *
+from utils.normalization import flatten
+from utils.progress_bar import ProgressBar
 
 
 def collect_data(base_path):
@@ -34,6 +26,42 @@ def collect_data(base_path):
     return [[tracing[i], masked_code[i], mask[i]] for i in range(entries)]
 
 
+def file_groups(data, df):
+    """
+    Groups consecutive examples coming from the same file, so that each file is read and parsed only once
+    """
+
+    group, group_key = [], None
+    for method_id, masked_code, mask in data:
+        with profiler.stage('lookup'):
+            row = df.loc[method_id]
+
+        key = (row['REPO_NAME'], row['FILE_NAME'])
+        if group and key != group_key:
+            yield group_key, group
+            group = []
+        group_key = key
+        group.append((method_id, row['VALID'], masked_code, mask))
+
+    if group:
+        yield group_key, group
+
+
+def run_extractor(extractor, watchdog, file_content, examples, key):
+    with profiler.stage('extract'):
+        if watchdog is None or not extractor.needs_file_content():
+            return list(extractor.extract_batch(file_content, examples))
+        return watchdog.extract_batch(extractor, file_content, examples, key)
+
+
+def is_failure(context):
+    if not isinstance(context, Exception):
+        return False
+    if not isinstance(context, (ExtractorError, LexerError, JavaSyntaxError, RecursionError, IndexError)):
+        print(context)
+    return True
+
+
 def conventional_tsv_name(folder):
     dataset, level, scope = folder.split('_')
     scope = scope.replace('training', 'train')
@@ -45,72 +73,133 @@ def main():
     extractor = extractor_factory(args.extractor)
     javadoc_extractor = extractor_factory(Extractors.javadoc)
 
+    watchdog = None
+    if args.timeout:
+        watchdog = Watchdog(args.timeout, args.recursion_limit, args.skip_list)
+
     delete_directory(args.tmp)
     create_directory_if_needed(args.tmp)
     create_directory_if_needed('out')
 
+    if args.profile:
+        profiler.enable()
+
     df = pd.read_csv(os.path.join(args.data, 'main.csv'))
     df = df.set_index('ID')
 
+    main_hash = file_hash(os.path.join(args.data, 'main.csv'))
+    archives_digest = archives_hash(args.data)
+    skip_digest = skip_list_hash(args)  # before the watchdog of this run adds to it
+    manifest = load_manifest('out')
+
     for folder in args.folders:
         base_path = os.path.join(args.data, folder)
         tsv_name = conventional_tsv_name(folder)
+        tsv_path = os.path.join('out', tsv_name)
+
+        folder_fingerprint = fingerprint(base_path, main_hash, archives_digest, skip_digest, args)
+        if args.resume and manifest.get(tsv_name) == folder_fingerprint and os.path.exists(tsv_path):
+            print(f'Skipping {tsv_name}: already up to date')
+            continue
 
-        data = collect_data(base_path)
+        profiler.reset()
+        with profiler.stage('collect'):
+            data = collect_data(base_path)
 
-        count = 1
+        processed = 0
         total = len(data)
 
-        bar = Bar('Processing ' + tsv_name.ljust(27), max=total)
-        start_at = datetime.now()
+        bar = ProgressBar(total, 'Processing ' + tsv_name.ljust(27))
 
         baseline_count = 0
         written_data = 0
 
-        with open(os.path.join('out', tsv_name), 'w') as f:
-            for method_id, masked_code, mask in data:
-                count_str = f'{count}/{total} ({float(count) / float(total) * 100:.2f}%%)'
-                bar.suffix = f'{count_str} | {elapsed_time(start_at)} | {baseline_count} | {written_data}'
-                row = df.loc[method_id]
-
-                if row['VALID']:
-                    flatten_masked_code = flatten(masked_code.replace('<x>', '<extra_id_0>'))
-                    flatten_mask = flatten(mask.replace('<z>', ''))
-
+        # resume from the last committed example, dropping anything written after it
+        checkpoint = load_checkpoint(tsv_path, folder_fingerprint) if args.resume else None
+        mode = 'w'
+        if checkpoint is not None:
+            with open(tsv_path, 'r+') as f:
+                f.truncate(checkpoint['offset'])
+            processed = checkpoint['processed']
+            data = data[processed:]
+            baseline_count = checkpoint['baseline_count']
+            written_data = checkpoint['written_data']
+            bar.goto(processed)
+            mode = 'a'
+        last_checkpoint = processed
+
+        with open(tsv_path, mode) as f:
+            for (repo_name, file_name), group in file_groups(data, df):
+                examples = []
+                with profiler.stage('flatten'):
+                    for method_id, valid, masked_code, mask in group:
+                        if valid:
+                            flatten_masked_code = flatten(masked_code.replace('<x>', '<extra_id_0>'))
+                            flatten_mask = flatten(mask.replace('<z>', ''))
+                            examples.append((method_id, flatten_masked_code, flatten_mask))
+
+                if examples:
                     file_content = None
+                    file_key = f'{repo_name}/{file_name}'
                     if extractor.needs_file_content():
-                        file_content = extract_file_content(args.data, args.tmp, row['REPO_NAME'], row['FILE_NAME'])
+                        file_content = extract_file_content(args.data, args.tmp, repo_name, file_name)
+
+                    pairs = [(masked_code, mask) for _, masked_code, mask in examples]
 
                     if args.dataset == Dataset.complete:
-                        try:
-                            context = flatten(extractor.extract(flatten_masked_code, flatten_mask, file_content))
-                        except (ExtractorError, LexerError, JavaSyntaxError, RecursionError, IndexError):
-                            baseline_count += 1
-                            context = extractor.baseline()
-                        except Exception as e:
-                            print(e)
-                            baseline_count += 1
-                            context = extractor.baseline()
-
-                        f.write(f'{flatten_masked_code} {context}\t{flatten_mask}\n')
-                        written_data += 1
+                        contexts = run_extractor(extractor, watchdog, file_content, pairs, file_key)
+
+                        for (_, flatten_masked_code, flatten_mask), context in zip(examples, contexts):
+                            if is_failure(context):
+                                baseline_count += 1
+                                context = extractor.baseline()
+                            else:
+                                with profiler.stage('flatten'):
+                                    context = flatten(context)
+
+                            with profiler.stage('write'):
+                                f.write(f'{flatten_masked_code} {context}\t{flatten_mask}\n')
+                            written_data += 1
                     else:  # javadoc dataset
-                        try:
-                            context = javadoc_extractor.extract(flatten_masked_code, flatten_mask, file_content)
-                            if extractor.value != Extractors.javadoc:
-                                context = extractor.extract(flatten_masked_code, flatten_mask, file_content)
-                            context = flatten(context)
-                            f.write(f'{method_id}\t{flatten_masked_code} {context}\t{flatten_mask}\n')
+                        javadocs = run_extractor(javadoc_extractor, watchdog, file_content, pairs, file_key)
+                        documented = [(example, javadoc) for example, javadoc in zip(examples, javadocs)
+                                      if not is_failure(javadoc)]
+
+                        if extractor.value != Extractors.javadoc:
+                            pairs = [(masked_code, mask) for (_, masked_code, mask), _ in documented]
+                            contexts = run_extractor(extractor, watchdog, file_content, pairs, file_key)
+                        else:
+                            contexts = [javadoc for _, javadoc in documented]
+
+                        for ((method_id, flatten_masked_code, flatten_mask), _), context in zip(documented, contexts):
+                            if is_failure(context):
+                                continue
+                            with profiler.stage('flatten'):
+                                context = flatten(context)
+                            with profiler.stage('write'):
+                                f.write(f'{method_id}\t{flatten_masked_code} {context}\t{flatten_mask}\n')
                             written_data += 1
-                        except (ExtractorError, LexerError, JavaSyntaxError, RecursionError, IndexError):
-                            pass
-                        except Exception as e:
-                            print(e)
-                            pass
-                count += 1
-                bar.next()
+
+                processed += len(group)
+                bar.update(baseline_count, written_data)
+                bar.next(len(group))
+
+                if processed - last_checkpoint >= CHECKPOINT_INTERVAL:
+                    f.flush()
+                    save_checkpoint(tsv_path, folder_fingerprint, processed, f.tell(), baseline_count, written_data)
+                    last_checkpoint = processed
 
         bar.finish()
+
+        manifest[tsv_name] = folder_fingerprint
+        save_manifest('out', manifest)
+        delete_checkpoint(tsv_path)
+
+        if args.profile:
+            profiler.dump(os.path.join('out', tsv_name.replace('.tsv', '.profile.json')))
+
+    if watchdog is not None:
+        watchdog.close()
     delete_directory(args.tmp)
 
 
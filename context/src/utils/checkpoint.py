@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+
+CHECKPOINT_INTERVAL = 1000
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def archives_hash(data_path):
+    """
+    Identifies the repository archives the contexts are extracted from, by name, size and modification time: hashing
+    their content would mean reading every archive again on each run
+    """
+
+    digest = hashlib.sha256()
+    archives_path = os.path.join(data_path, 'archives')
+    if os.path.isdir(archives_path):
+        for name in sorted(os.listdir(archives_path)):
+            stat = os.stat(os.path.join(archives_path, name))
+            digest.update(f'{name}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def skip_list_hash(args):
+    """
+    Identifies the skip list the watchdog starts from. Without --timeout there is no watchdog and the list is not read
+    """
+
+    if not args.timeout or not os.path.exists(args.skip_list):
+        return ''
+    return file_hash(args.skip_list)
+
+
+def fingerprint(base_path, main_hash, archives_digest, skip_digest, args):
+    """
+    Identifies the output of a folder: it changes whenever one of its input files, the repository archives or the
+    extraction settings (including the watchdog and its skip list) change
+    """
+
+    digest = hashlib.sha256()
+    digest.update(f'{args.extractor}|{args.dataset}|{main_hash}|{archives_digest}|'
+                  f'{args.timeout}|{args.recursion_limit}|{skip_digest}'.encode())
+    for name in ['tracing.txt', 'masked_code.txt', 'mask.txt']:
+        digest.update(file_hash(os.path.join(base_path, name)).encode())
+    return digest.hexdigest()
+
+
+def write_json(path, data):
+    # write to a temporary file first, so that an interruption never leaves a truncated file behind
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_manifest(out_path):
+    return read_json(os.path.join(out_path, 'manifest.json')) or {}
+
+
+def save_manifest(out_path, manifest):
+    write_json(os.path.join(out_path, 'manifest.json'), manifest)
+
+
+def checkpoint_path(tsv_path):
+    return tsv_path + '.checkpoint'
+
+
+def load_checkpoint(tsv_path, folder_fingerprint):
+    """
+    Returns the last committed checkpoint of an output file, or None if there is none or if it belongs to different
+    inputs or settings
+    """
+
+    checkpoint = read_json(checkpoint_path(tsv_path))
+    if checkpoint is None or checkpoint['fingerprint'] != folder_fingerprint or not os.path.exists(tsv_path):
+        return None
+    return checkpoint
+
+
+def save_checkpoint(tsv_path, folder_fingerprint, processed, offset, baseline_count, written_data):
+    write_json(checkpoint_path(tsv_path), {
+        'fingerprint': folder_fingerprint,
+        'processed': processed,
+        'offset': offset,
+        'baseline_count': baseline_count,
+        'written_data': written_data,
+    })
+
+
+def delete_checkpoint(tsv_path):
+    if os.path.exists(checkpoint_path(tsv_path)):
+        os.remove(checkpoint_path(tsv_path))
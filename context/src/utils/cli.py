@@ -44,8 +44,32 @@ def CLI():
                         nargs='+', help='Path to folder(s) to extract context from',
                         type=str, required=True)
 
+    parser.add_argument('--resume', '-r', dest='resume',
+                        help='Resume interrupted output files and skip the folders whose inputs did not change',
+                        action='store_true')
+
+    parser.add_argument('--profile', '-p', dest='profile',
+                        help='Record per-stage timings and memory peaks in a JSON report for each folder',
+                        action='store_true')
+
+    parser.add_argument('--timeout', dest='timeout',
+                        help='Maximum number of seconds allowed to extract the context of a single example. '
+                             'When set, the extraction runs in a separate worker process',
+                        type=float, default=None)
+
+    parser.add_argument('--recursion-limit', dest='recursion_limit',
+                        help='Recursion limit of the worker process (requires --timeout)',
+                        type=int, default=None)
+
+    parser.add_argument('--skip-list', dest='skip_list',
+                        help='File listing the source files that exceeded the budget in previous runs',
+                        type=str, default='./skip_list.txt')
+
     args = parser.parse_args()
 
+    if args.recursion_limit and not args.timeout:
+        parser.error('--recursion-limit requires --timeout')
+
     if args.dataset == Dataset.javadoc:
         for folder in args.folders:
             if folder not in levels:
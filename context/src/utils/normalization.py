@@ -0,0 +1,9 @@
+import re
+
+# whitespace and escaped new lines/tabs ('\n', '\t' written as two characters) are collapsed in a single pass
+FLATTEN_PATTERN = re.compile(r'(?:\s|\\[nt])+')
+
+
+def flatten(string):
+    return FLATTEN_PATTERN.sub(' ', string.strip())
+
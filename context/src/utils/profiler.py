@@ -0,0 +1,121 @@
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import nullcontext
+
+
+class Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.peak = 0
+        self.start = 0.0
+
+    def __enter__(self):
+        self.profiler.open_stage(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.close_stage(self, elapsed)
+        return False
+
+
+class Profiler:
+    """
+    Collects per-stage timings, call counts, cache statistics and memory peaks.
+    When disabled every method is a no-op, so it can be left in the hot loop.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.timings = defaultdict(list)
+        self.peaks = defaultdict(int)
+        self.caches = defaultdict(lambda: {'hit': 0, 'miss': 0})
+        self.stack = []
+
+    def enable(self):
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self):
+        self.timings.clear()
+        self.peaks.clear()
+        self.caches.clear()
+        self.stack = []
+        if self.enabled:
+            tracemalloc.reset_peak()
+
+    def stage(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return Stage(self, name)
+
+    def open_stage(self, stage):
+        # fold the peak reached so far into the open stages before resetting it for the new one
+        _, peak = tracemalloc.get_traced_memory()
+        for parent in self.stack:
+            parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        self.stack.append(stage)
+
+    def close_stage(self, stage, elapsed):
+        _, peak = tracemalloc.get_traced_memory()
+        stage.peak = max(stage.peak, peak)
+        self.stack.pop()
+        if self.stack:
+            self.stack[-1].peak = max(self.stack[-1].peak, stage.peak)
+
+        self.timings[stage.name].append(elapsed)
+        self.peaks[stage.name] = max(self.peaks[stage.name], stage.peak)
+
+    def hit(self, cache):
+        if self.enabled:
+            self.caches[cache]['hit'] += 1
+
+    def miss(self, cache):
+        if self.enabled:
+            self.caches[cache]['miss'] += 1
+
+    def report(self):
+        stages = {}
+        for name, timings in self.timings.items():
+            timings = sorted(timings)
+            stages[name] = {
+                'calls': len(timings),
+                'total': sum(timings),
+                'mean': sum(timings) / len(timings),
+                'p50': percentile(timings, 50),
+                'p90': percentile(timings, 90),
+                'p99': percentile(timings, 99),
+                'max': timings[-1],
+                'peak_memory': self.peaks[name],
+            }
+
+        caches = {}
+        for name, counts in self.caches.items():
+            lookups = counts['hit'] + counts['miss']
+            caches[name] = {**counts, 'hit_ratio': counts['hit'] / lookups if lookups else 0.0}
+
+        return {'stages': stages, 'caches': caches}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def percentile(sorted_values, p):
+    index = round(p / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+# stages are timed inclusively: a stage opened inside another one is also counted in the outer one
+profiler = Profiler()
@@ -0,0 +1,109 @@
+import sys
+import time
+
+BAR_WIDTH = 32
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:02}:{minutes:02}:{seconds:02}'
+
+
+class ProgressBar:
+    """
+    Progress bar class
+    Counting an item only increments an integer: the bar is redrawn at most every `interval` seconds, or logged every
+    `log_interval` seconds when the output is not a terminal
+    """
+
+    def __init__(self, total, label='Processing', interval=0.5, log_interval=30, smoothing=0.3):
+        self.total = max(total, 1)
+        self.label = label
+        self.count = 0
+        self.info = ()
+
+        self.tty = sys.stderr.isatty()
+        self.interval = interval if self.tty else log_interval
+        self.smoothing = smoothing
+
+        self.start = time.monotonic()
+        self.next_draw = self.start
+        self.last_time = self.start
+        self.last_count = 0
+        self.rate = None
+
+    def update(self, *info):
+        """
+        Update the information displayed next to the progress bar
+        The values are only formatted when the bar is redrawn
+        :param info: all the information to be displayed
+        """
+
+        self.info = info
+
+    def next(self, n=1):
+        """
+        Increment the progress bar
+        :param n: number of completed items
+        """
+
+        self.count += n
+        if time.monotonic() >= self.next_draw:
+            self.draw()
+
+    def goto(self, count):
+        """
+        Move the progress bar to the given count (e.g., when resuming)
+        :param count: number of completed items
+        """
+
+        self.count = count
+        self.last_count = count
+        self.draw()
+
+    def poll(self):
+        """
+        Redraw the progress bar if it is due, to be called periodically while waiting for the next item, so that the
+        elapsed time keeps moving
+        """
+
+        if time.monotonic() >= self.next_draw:
+            self.draw()
+
+    def draw(self, final=False):
+        now = time.monotonic()
+        count = self.count
+
+        # exponentially weighted rate, so that the ETA follows changes in speed without jumping around
+        if now > self.last_time and count > self.last_count:
+            rate = (count - self.last_count) / (now - self.last_time)
+            self.rate = rate if self.rate is None else self.smoothing * rate + (1 - self.smoothing) * self.rate
+            self.last_time, self.last_count = now, count
+
+        fraction = min(count / self.total, 1)
+        parts = [f'{count}/{self.total} ({fraction * 100:.2f}%)', format_seconds(now - self.start)]
+        if self.rate:
+            parts.append(f'{self.rate:.1f}/s')
+            if not final:
+                parts.append(f'ETA {format_seconds(max(self.total - count, 0) / self.rate)}')
+        parts.extend(str(i) for i in self.info)
+        line = f'{self.label} ' + ' | '.join(parts)
+
+        if self.tty:
+            filled = int(fraction * BAR_WIDTH)
+            bar = '#' * filled + ' ' * (BAR_WIDTH - filled)
+            sys.stderr.write(f'\r\x1b[K{self.label} |{bar}| ' + ' | '.join(parts) + ('\n' if final else ''))
+        else:
+            sys.stderr.write(line + '\n')
+        sys.stderr.flush()
+
+        self.next_draw = now + self.interval
+
+    def finish(self):
+        """
+        Finish the progress bar
+        To be called after the last iteration
+        """
+
+        self.draw(final=True)
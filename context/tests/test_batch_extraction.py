@@ -0,0 +1,101 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from context.classes import InvokingSignatureExtractor, JavadocExtractor  # noqa: E402
+
+FILE_CONTENT = '''
+package example;
+
+public class Calculator {
+    public Calculator() {
+    }
+
+    /**
+     * Adds two numbers
+     */
+    public int add(int a, int b) {
+        return a + b;
+    }
+
+    public int twice(int a) {
+        return add(a, a);
+    }
+}
+
+class Printer {
+    /**
+     * Prints a number
+     */
+    public void print(int value) {
+        System.out.println(value);
+    }
+
+    public void printTwice(int value) {
+        print(value);
+        print(value);
+    }
+}
+'''
+
+EXAMPLES = [
+    ('public int add(int a, int b) { return <extra_id_0>; }', 'a + b'),
+    ('public int twice(int a) { return <extra_id_0>; }', 'add(a, a)'),
+    ('public void print(int value) { <extra_id_0> }', 'System.out.println(value);'),
+    ('public void printTwice(int value) { print(value); <extra_id_0> }', 'print(value);'),
+    ('public Calculator() { <extra_id_0> }', ''),
+    # no class has this method, so it cannot be isolated
+    ('public int missing(int a) { return <extra_id_0>; }', 'a'),
+    # the method itself cannot be parsed
+    ('public int broken(int a { return <extra_id_0>; }', 'a'),
+]
+
+
+def outcome(extract):
+    # exceptions cannot be compared directly, their type and message are
+    try:
+        context = extract()
+    except Exception as e:
+        return type(e), str(e)
+    if isinstance(context, Exception):
+        return type(context), str(context)
+    return context
+
+
+class BatchExtractionTest(unittest.TestCase):
+    """
+    Batch extraction parses each file once for all its examples, it must give the same contexts (and errors) as
+    extracting every example on its own
+    """
+
+    def assert_same_as_single(self, extractor, file_content, examples):
+        batch = list(extractor.extract_batch(file_content, examples))
+        self.assertEqual(len(batch), len(examples))
+
+        for (masked_code, mask), context in zip(examples, batch):
+            single = outcome(lambda: extractor.extract(masked_code, mask, file_content))
+            self.assertEqual(outcome(lambda: context), single, masked_code)
+
+    def test_invoking_signature(self):
+        self.assert_same_as_single(InvokingSignatureExtractor(), FILE_CONTENT, EXAMPLES)
+
+    def test_javadoc(self):
+        self.assert_same_as_single(JavadocExtractor(), FILE_CONTENT, EXAMPLES)
+
+    def test_unparsable_file(self):
+        for extractor in [InvokingSignatureExtractor(), JavadocExtractor()]:
+            self.assert_same_as_single(extractor, 'public class Broken {', EXAMPLES[:2])
+
+    def test_errors_are_covered(self):
+        # the examples include both successes and the errors that batching must preserve
+        contexts = [outcome(lambda: c) for c in JavadocExtractor().extract_batch(FILE_CONTENT, EXAMPLES)]
+        messages = [c[1] for c in contexts if isinstance(c, tuple)]
+        self.assertIn('<SEP> /**\n     * Adds two numbers\n     */', contexts)
+        self.assertIn('No javadoc found', messages)
+        self.assertIn('Could not isolate class', messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
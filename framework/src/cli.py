@@ -18,6 +18,20 @@ def is_valid_input_file(parser: ArgumentParser, arg):
     parser.error(f'The file {arg} does not exist or is not a CSV file')
 
 
+def is_valid_fragment_dir(parser: ArgumentParser, arg: str):
+    """
+    Ensures that the fragment is a resources directory created by the mining phase
+    :param parser: the parser object
+    :param arg: the directory provided by the user
+    :return: the directory if it contains the three resource files
+    """
+
+    for file in ['repositories.csv', 'tracing.csv', 'expected.csv']:
+        if not os.path.isfile(os.path.join(arg, file)):
+            parser.error(f'The directory {arg} does not contain {file}')
+    return arg
+
+
 def is_valid_output_dir(parser: ArgumentParser, arg: str):
     """
     Ensures that the output path is valid
@@ -104,7 +118,10 @@ def handle_mode(parser: ArgumentParser, args: Namespace, required: list, not_all
         'coverage_type': 'none',
         'coverage_threshold': None,
         'max_eval_time': None,
-        'bleu': 'avg'
+        'bleu': 'avg',
+        'jobs': 1,
+        'retry': False,
+        'fragments': None
     }
 
     for param in required:
@@ -117,22 +134,26 @@ def handle_mode(parser: ArgumentParser, args: Namespace, required: list, not_all
 
 def handle_mine(parser: ArgumentParser, args: Namespace):
     # Required parameters: input
-    # Optional parameters:
-    # Not allowed parameters: output, min, max, measure, bleu, coverage_type, coverage_threshold
+    # Optional parameters: jobs, retry
+    # Not allowed parameters: output, min, max, measure, bleu, coverage_type, coverage_threshold, fragments
 
     required = ['input']
-    not_allowed = ['output', 'min', 'max', 'measure', 'bleu', 'coverage_type', 'coverage_threshold', 'max_eval_time']
+    not_allowed = ['output', 'min', 'max', 'measure', 'bleu', 'coverage_type', 'coverage_threshold', 'max_eval_time',
+                   'fragments']
 
     handle_mode(parser, args, required, not_allowed)
 
+    if args.jobs < 1:
+        parser.error('Argument "jobs" must be at least 1')
+
 
 def handle_generate(parser: ArgumentParser, args: Namespace):
     # Required parameters: output,
     # Optional parameters: min, max, measure, coverage_type, coverage_threshold
-    # Not allowed parameters: input, bleu
+    # Not allowed parameters: input, bleu, jobs, retry, fragments
 
     required = ['output']
-    not_allowed = ['input', 'bleu']
+    not_allowed = ['input', 'bleu', 'jobs', 'retry', 'fragments']
 
     handle_mode(parser, args, required, not_allowed)
 
@@ -150,10 +171,23 @@ def handle_generate(parser: ArgumentParser, args: Namespace):
 def handle_evaluate(parser: ArgumentParser, args: Namespace):
     # Required parameters: input, output
     # Optional parameters: bleu
-    # Not allowed parameters: min, max, measure, coverage_type, coverage_threshold
+    # Not allowed parameters: min, max, measure, coverage_type, coverage_threshold, jobs, retry, fragments
 
     required = ['input', 'output']
-    not_allowed = ['min', 'max', 'measure', 'coverage_type', 'coverage_threshold', 'max_eval_time']
+    not_allowed = ['min', 'max', 'measure', 'coverage_type', 'coverage_threshold', 'max_eval_time', 'jobs', 'retry',
+                   'fragments']
+
+    handle_mode(parser, args, required, not_allowed)
+
+
+def handle_merge(parser: ArgumentParser, args: Namespace):
+    # Required parameters: fragments
+    # Optional parameters:
+    # Not allowed parameters: input, output, min, max, measure, bleu, coverage_type, coverage_threshold, jobs, retry
+
+    required = ['fragments']
+    not_allowed = ['input', 'output', 'min', 'max', 'measure', 'bleu', 'coverage_type', 'coverage_threshold',
+                   'max_eval_time', 'jobs', 'retry']
 
     handle_mode(parser, args, required, not_allowed)
 
@@ -167,7 +201,7 @@ def CLI():
 
     parser = ArgumentParser(description='Framework for evaluating AI models')
 
-    parser.add_argument('--action', '-a', type=str, required=True, choices=['mine', 'generate', 'evaluate'],
+    parser.add_argument('--action', '-a', type=str, required=True, choices=['mine', 'generate', 'evaluate', 'merge'],
                         help='Action to perform')
 
     mine = parser.add_argument_group('Mining')
@@ -175,6 +209,13 @@ def CLI():
     mine.add_argument('--input', '-i', dest='input', required=False, help='Input CSV file',
                       type=lambda x: is_valid_input_file(parser, x))
 
+    mine.add_argument('--jobs', '-j', dest='jobs', required=False, default=1,
+                      type=lambda x: positive_int(parser, 'jobs', x),
+                      help='Number of repositories to build in parallel')
+
+    mine.add_argument('--retry', '-r', dest='retry', required=False, action='store_true',
+                      help='Mine again the repositories that failed in the previous runs')
+
     mine.add_argument('--output', '-o', dest='output', required=False, help='Output directory',
                       type=lambda x: is_valid_output_dir(parser, x))
 
@@ -207,6 +248,12 @@ def CLI():
                           type=lambda x: 'avg' if x == 'average' or x == 'a' else x,
                           help='The BLEU score to use when evaluating the model')
 
+    merge = parser.add_argument_group('Merge')
+
+    merge.add_argument('--fragments', '-f', dest='fragments', required=False, nargs='+',
+                       type=lambda x: is_valid_fragment_dir(parser, x),
+                       help='Resources directories mined separately, to be merged into the resources directory')
+
     args = parser.parse_args()
 
     if args.action == 'mine':
@@ -215,5 +262,7 @@ def CLI():
         handle_generate(parser, args)
     elif args.action == 'evaluate':
         handle_evaluate(parser, args)
+    elif args.action == 'merge':
+        handle_merge(parser, args)
 
     return args
@@ -1,11 +1,11 @@
-import re
 import sys
 import numpy as np
 import pandas as pd
-from datetime import datetime
 from metrics import accuracy, bleu_score, levenshtein_distance, integrity
 from utils.file_system import reformat_repo_name, create_directory_if_needed
-from utils.progress_bar import ProgressBar
+from utils.progress_bar import ProgressBar, format_seconds
+from utils.scheduler import predict_makespan
+from utils.normalization import clean_series
 
 
 def parse_predictions(predictions_path):
@@ -34,16 +34,6 @@ def parse_predictions(predictions_path):
     return df
 
 
-def clean(string):
-    """
-    Removes all <NEW_LINE> tokens and cleans the string from excess whitespaces
-    :param string: the string to clean
-    :return: the cleaned string
-    """
-
-    return re.sub(r'\s+', ' ', string.strip().replace('<NEW_LINE>', ' '))
-
-
 def log(data, file_path, mode='w'):
     """
     Writes the data to the file at the given path
@@ -118,24 +108,34 @@ def evaluate(predictions_path, output_folder, preferred_n_gram):
     # predicted columns: id, predicted_method, masked_code, predicted_code
     predicted = parse_predictions(predictions_path)
 
-    # repositories columns: name, tag, project, root, status, time
-    repositories = pd.read_csv("resources/repositories.csv").set_index("id").fillna('')
+    # repositories columns: name, tag, project, root, status, time, methods
+    # a repository mined more than once has a row per run, the last one is the current
+    repositories = pd.read_csv("resources/repositories.csv").drop_duplicates('id', keep='last')
+    repositories = repositories.set_index("id").fillna('')
 
     # tracing columns: repo_id, file, start, end, instruction_coverage, line_coverage
     tracing = pd.read_csv("resources/tracing.csv").set_index("method_id")
 
     predicted = predicted.join(tracing, on='id', how='inner')
+    for column in ['predicted_method', 'masked_code', 'predicted_code']:
+        predicted[column] = clean_series(predicted[column].astype(str))
+
+    # only the predictions that differ from the expected code are built, each taking about as long as the mining build
+    build_times = [repositories.loc[row.repo_id, 'time'] for row in predicted.itertuples()
+                   if not accuracy(row.masked_code, row.predicted_code)]
+    print(f'Predicted evaluation time: {format_seconds(predict_makespan(build_times, 1))} '
+          f'(builds: {len(build_times)}, fewer if some were already evaluated)')
 
     log('id,accuracy,bleu_score,levenshtein_distance,tests_passed,timeout\n', output_folder + '/log.csv', 'w')
 
-    bar = ProgressBar(predicted)
+    bar = ProgressBar(len(predicted))
     for row in predicted.itertuples():
-        bar.update(f'{row.id}', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        bar.update(row.id)
         bar.next()
 
         # collect data
-        predicted_method = clean(row.predicted_method)
-        target_code, predicted_code = clean(row.masked_code), clean(row.predicted_code)
+        predicted_method = row.predicted_method
+        target_code, predicted_code = row.masked_code, row.predicted_code
         file, start, end = row.file, row.start, row.end
 
         repo = repositories.loc[row.repo_id]
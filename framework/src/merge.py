@@ -0,0 +1,181 @@
+import os
+import csv
+import sys
+import shutil
+from collections import Counter
+from utils.file_system import create_directory_if_needed, delete_dir, reformat_repo_name
+from mine_utils.ids import pack_method_id, unpack_method_id
+
+MERGE_DIRECTORY = 'resources_merging'  # where the fragments are merged before replacing the resources directory
+REPOSITORIES_HEADER = ['id', 'name', 'tag', 'project', 'root', 'status', 'time', 'methods']
+
+
+def read_rows(path):
+    """
+    Reads the rows of a resource file as text, so that the values are written back exactly as they were mined
+    :param path: the path to the CSV file
+    :return: an iterator over the rows, without the header
+    """
+
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        yield from reader
+
+
+def read_repositories(directory):
+    """
+    Reads the rows of the repositories.csv file of a resources directory. The files written before the `methods` column
+    existed get it from the number of rows of each repository in the tracing.csv file. Rows without the fields of the
+    header (e.g., the last one of an interrupted run) are set apart, so that no value ends up in the wrong column
+    :param directory: the resources directory
+    :return: a tuple with the list of rows, without the header, and the list of (line number, row) of the malformed ones
+    """
+
+    path = os.path.join(directory, 'repositories.csv')
+    with open(path, 'r', newline='') as f:
+        header = next(csv.reader(f))
+
+    if header != REPOSITORIES_HEADER and header != REPOSITORIES_HEADER[:-1]:
+        print(f'{path}: unknown header {",".join(header)}', file=sys.stderr)
+        exit(1)
+
+    rows, malformed = [], []
+    for line, row in enumerate(read_rows(path), start=2):
+        if len(row) == len(header):
+            rows.append(row)
+        else:
+            malformed.append((line, row))
+
+    if header != REPOSITORIES_HEADER:
+        methods = Counter(repo_id for _, repo_id, *_ in read_rows(os.path.join(directory, 'tracing.csv')))
+        rows = [row + [methods[row[0]]] for row in rows]
+
+    return rows, malformed
+
+
+def migrate_repositories(directory='resources'):
+    """
+    Rewrites the repositories.csv file of a resources directory written before the `methods` column existed, so that
+    new rows can be appended to it. The malformed rows are dropped and listed in malformed_repositories.txt
+    :param directory: the resources directory
+    :return: whether the file was rewritten
+    """
+
+    path = os.path.join(directory, 'repositories.csv')
+    with open(path, 'r', newline='') as f:
+        if next(csv.reader(f)) == REPOSITORIES_HEADER:
+            return False
+
+    rows, malformed = read_repositories(directory)
+    with open(f'{path}.tmp', 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(REPOSITORIES_HEADER)
+        writer.writerows(rows)
+    os.replace(f'{path}.tmp', path)
+    print(f'Added the methods column to {path}')
+
+    if malformed:
+        with open(os.path.join(directory, 'malformed_repositories.txt'), 'w') as f:
+            for line, row in malformed:
+                f.write(f'{line}\t{",".join(row)}\n')
+        print(f'{len(malformed)} malformed rows were dropped, see {directory}/malformed_repositories.txt')
+
+    return True
+
+
+def merge_fragments(fragments, directory):
+    """
+    Writes the merged resources of the fragments into a new directory, see `merge`
+    :param fragments: the resources directories to merge
+    :param directory: the empty directory where the merged resources are written
+    :return: the number of merged repositories
+    """
+
+    repositories = open(os.path.join(directory, 'repositories.csv'), 'w', newline='')
+    tracing = open(os.path.join(directory, 'tracing.csv'), 'w', newline='')
+    expected = open(os.path.join(directory, 'expected.csv'), 'w', newline='')
+
+    with repositories, tracing, expected:
+        repositories_writer = csv.writer(repositories, lineterminator='\n')
+        tracing_writer = csv.writer(tracing, lineterminator='\n')
+        expected_writer = csv.writer(expected, lineterminator='\n', quoting=csv.QUOTE_NONNUMERIC)
+
+        repositories_writer.writerow(REPOSITORIES_HEADER)
+        tracing_writer.writerow(['method_id', 'repo_id', 'file', 'start', 'end', 'instruction_coverage',
+                                 'line_coverage'])
+        expected.write('id,code\n')  # the header is not quoted, unlike the code
+
+        merged_names = set()
+        next_repo_id = 0
+
+        for fragment in fragments:
+            # old repository id -> new repository id, only for the repositories taken from this fragment
+            repo_ids = {}
+
+            # a repository mined more than once has a row per run, the last one is the current
+            rows = {}
+            fragment_rows, malformed = read_repositories(fragment)
+            for repo_id, name, *fields in fragment_rows:
+                rows[name] = repo_id, fields
+            for line, _ in malformed:
+                print(f'{fragment}/repositories.csv: skipped the malformed row at line {line}', file=sys.stderr)
+
+            for name, (repo_id, fields) in rows.items():
+                if name in merged_names:
+                    continue
+                merged_names.add(name)
+
+                repo_ids[int(repo_id)] = next_repo_id
+                repositories_writer.writerow([next_repo_id, name, *fields])
+                next_repo_id += 1
+
+                archive = os.path.join(fragment, f'{reformat_repo_name(name)}.zip')
+                if os.path.exists(archive):
+                    shutil.copy2(archive, directory)
+
+            for method_id, repo_id, *fields in read_rows(os.path.join(fragment, 'tracing.csv')):
+                old_repo_id, sequence = unpack_method_id(method_id)
+                if old_repo_id != int(repo_id):
+                    print(f'{fragment}: method {method_id} was not mined with repository-based ids', file=sys.stderr)
+                    exit(1)
+                if old_repo_id in repo_ids:
+                    new_repo_id = repo_ids[old_repo_id]
+                    tracing_writer.writerow([pack_method_id(new_repo_id, sequence), new_repo_id, *fields])
+
+            for method_id, code in read_rows(os.path.join(fragment, 'expected.csv')):
+                old_repo_id, sequence = unpack_method_id(method_id)
+                if old_repo_id in repo_ids:
+                    expected_writer.writerow([pack_method_id(repo_ids[old_repo_id], sequence), code])
+
+    return next_repo_id
+
+
+def merge(fragments):
+    """
+    Merges the resources mined by several workers (or machines) into the `resources` directory.
+    The repositories are given new ids in the order of the fragments, and every method id is remapped to the new id of
+    its repository, keeping its position inside the repository. A repository mined in more than one fragment is only
+    taken from the first one.
+    The resources directory is only replaced once every fragment was merged, so it is left untouched if merging fails
+    :param fragments: the resources directories to merge
+    """
+
+    resources = os.path.realpath('resources')
+    for fragment in fragments:
+        if os.path.commonpath([os.path.realpath(fragment), resources]) == resources:
+            print(f'{fragment}: the fragments cannot be inside the resources directory, which is overwritten',
+                  file=sys.stderr)
+            exit(1)
+
+    delete_dir(MERGE_DIRECTORY)
+    create_directory_if_needed(MERGE_DIRECTORY)
+
+    try:
+        merged = merge_fragments(fragments, MERGE_DIRECTORY)
+        delete_dir('resources')
+        os.rename(MERGE_DIRECTORY, 'resources')
+    finally:
+        delete_dir(MERGE_DIRECTORY)
+
+    print(f'Merged {merged} repositories from {len(fragments)} fragments')
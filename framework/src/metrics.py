@@ -1,10 +1,10 @@
 import os
 import nltk
 import numpy as np
-from multiprocessing import Process
-from utils.timer import run_with_timer
-from utils.file_system import unzip_dir, delete_dir
-from mine_utils.compilation import compile_mvn_project, compile_gradle_project
+from utils.file_system import unzip_dir, delete_dir, read_archived_lines
+from mine_utils.compilation import compile_project, build_command, prefetch_dependencies, dependencies_ready, \
+    mark_dependencies_ready
+from mine_utils.build_cache import hash_values, hash_archive, build_key, lookup_build, store_build
 
 
 def accuracy(target: str, predicted: str):
@@ -103,25 +103,39 @@ def integrity(repo_name, root, file, start, end, predicted_code, project, max_ti
         - second element: success of the task (True if the task ended in time, False if it timed out)
     """
 
-    unzip_dir(repo_name)
-    working_dir = os.path.join('tmp_evaluate', repo_name, root)
-    file_path = os.path.join(working_dir, file)
-
     # replace the original code with the predicted code
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
+    lines = read_archived_lines(repo_name, os.path.join(root, file))
     content = ''.join(lines[:start] + [predicted_code] + lines[end:])
-    with open(file_path, 'w') as f:
-        f.write(content)
 
-    # build the project allowing for an extra 10% of time
+    # build the project allowing for an extra 10% of time. The build outputs are neither archived nor extracted, so
+    # there is nothing to clean. The dependency cache is filled while mining, so the build never touches the network,
+    # unless the repository was mined elsewhere: then it is built online until a build succeeds, proving that the cache
+    # holds all of its dependencies (a prefetch can miss some, e.g. the test providers resolved at runtime)
     timeout = 60 + max_time * 1.1
-    if project == 'mvn':
-        target = compile_mvn_project
-    else:
-        target = compile_gradle_project
+    offline = dependencies_ready(repo_name)
+    command = build_command(project, clean=False, offline=offline)
+
+    # the built tree is the archived one with a single file replaced
+    tree = hash_values(hash_archive(f'resources/{repo_name}.zip'), root, file, content)
+    key = build_key(tree, command)
+
+    result = lookup_build(key, timeout)
+    if result is None:
+        unzip_dir(repo_name, root)
+        working_dir = os.path.join('tmp_evaluate', repo_name, root)
+
+        # the downloads of the first online build do not count against its timeout
+        if not offline:
+            prefetch_dependencies(working_dir, project)
+
+        with open(os.path.join(working_dir, file), 'w') as f:
+            f.write(content)
+
+        result = compile_project(working_dir, command, timeout)
+        delete_dir('tmp_evaluate')
+        store_build(key, result, timeout)
 
-    completed, success, _ = run_with_timer(target=target, args=working_dir, timeout=timeout)
-    delete_dir('tmp_evaluate')
+        if not offline and result.exit_code == 0:
+            mark_dependencies_ready(repo_name)
 
-    return completed, success
+    return not result.timed_out, result.exit_code == 0
@@ -1,197 +1,469 @@
 import os
+import sys
+import math
+import signal
 import traceback
 import pandas as pd
-from datetime import datetime
+from queue import Empty
+from multiprocessing import Process, Queue
 from git.exc import GitCommandError
-from utils.timer import run_with_timer
-from utils.progress_bar import ProgressBar
-from mine_utils.git_handler import clone_repository, extract_tag
+from utils.progress_bar import ProgressBar, format_seconds
+from utils.scheduler import estimate_durations, lpt_order, predict_makespan
+from utils.resource_logger import ResourceLogger
+from merge import REPOSITORIES_HEADER, migrate_repositories
+from mine_utils.ids import id_generator
+from mine_utils.git_handler import clone_latest_tag
 from mine_utils.jacoco_handler import extract_dataset_methods
 from mine_utils.parse_file import parse_mvn, parse_gradle
-from utils.file_system import create_working_environment, zip_dir, delete_dir, reformat_repo_name, UnzippableError
+from utils.file_system import create_working_environment, zip_dir, delete_dir, reformat_repo_name, UnzippableError, \
+    create_directory_if_needed
 from mine_utils.inject_dependency import inject_mvn_dependency, inject_gradle_dependency
-from mine_utils.compilation import compile_mvn_project, compile_gradle_project, check_mvn_report, check_gradle_report
+from mine_utils.compilation import compile_project, build_command, check_mvn_report, check_gradle_report, \
+    prefetch_dependencies, mark_dependencies_ready
+from mine_utils.build_cache import hash_tree, build_key, lookup_build, store_build
 from mine_utils.mine_exceptions import MineException, NonBuildableException, TimeoutException, InvalidProjectException
 
+BUILD_TIMEOUT = 60 * 90  # 90 minutes
 
-def logger():
+# statuses caused by the environment rather than by the repository, always mined again
+TRANSIENT_STATUSES = {'clone_timeout', 'error'}
+
+# processes of the stages around the build, for each build process (--jobs)
+PREPARE_WORKERS = 1  # cloning and downloading the dependencies
+ARCHIVE_WORKERS = 0.5  # archiving and parsing the JaCoCo report
+# repositories prepared in advance, waiting for a build process, for each build process
+READY_REPOSITORIES = 1
+
+
+def buffered_logger():
     """
-    Logger function for the resource files
+    Logger function that keeps the fragments in memory, so that a worker can hand them over to the single writer
+    :return: the log function and the list of (file, message) records it fills
     """
 
+    records = []
+
     def log(msg, file):
-        with open(f'resources/{file}.csv', 'a') as f:
-            f.write(f'{msg}')
+        records.append((file, msg))
+
+    return log, records
+
+
+def repository_row(repo_id, name, tag='N/A', project='N/A', root='N/A', status='error', time=float('NaN'), methods=0):
+    """
+    Formats a whole row of the repositories.csv file
+    :return: the row, including the new line
+    """
+
+    return f'{repo_id},{name},{tag},{project},{root},{status},{time},{methods}\n'
+
+
+def read_outcomes():
+    """
+    Reads the outcome of the repositories mined by the previous runs. A repository mined more than once has one row per
+    run, the last one is its current outcome
+    :return: a dictionary mapping the name of each repository to its id, status and build time (NaN if unknown)
+    """
+
+    path = 'resources/repositories.csv'
+    if not os.path.exists(path):
+        return {}
+
+    df = pd.read_csv(path, usecols=['id', 'name', 'status', 'time'], keep_default_na=False)
+    df = df.drop_duplicates('name', keep='last')
+    df['time'] = pd.to_numeric(df['time'], errors='coerce')
+    return {row.name: (row.id, row.status, row.time) for row in df.itertuples()}
+
+
+def plan_repositories(names, outcomes, retry=False):
+    """
+    Chooses the repositories to mine in this run: the new ones, which get the next free ids, and the ones whose last
+    mining failed because of the environment. The ones that failed because of the repository itself are only mined
+    again if asked to, while the successful ones never are
+    :param names: the names of the repositories in the input file
+    :param outcomes: the outcome of the repositories mined by the previous runs, see `read_outcomes`
+    :param retry: whether to mine again the repositories that failed
+    :return: a list of (name, repo_id) tuples
+    """
+
+    next_id = max((repo_id for repo_id, _, _ in outcomes.values()), default=-1) + 1
+    planned = []
+
+    for name in dict.fromkeys(names):
+        if name in outcomes:
+            repo_id, status, _ = outcomes[name]
+            if status == 'success' or (status not in TRANSIENT_STATUSES and not retry):
+                continue
+        else:
+            repo_id = next_id
+            next_id += 1
+
+        planned.append((name, repo_id))
 
-    return log
+    return planned
 
 
-def id_generator():
+def schedule_repositories(repositories, outcomes, jobs):
     """
-    Creates a unique id generator
-    :return: the id generator
+    Orders the repositories by estimated build time, longest first, so that no build process is left idle while the
+    last long builds run, and prints the predicted duration of the builds.
+    The build time of a repository is the one recorded by its last mining, the timeout if it timed out, and otherwise
+    the median of the recorded ones
+    :param repositories: the (name, repo_id) tuples of the repositories to mine, see `plan_repositories`
+    :param outcomes: the outcome of the repositories mined by the previous runs, see `read_outcomes`
+    :param jobs: the number of build processes
+    :return: the ordered repositories
     """
 
-    def generate_id():
-        """
-        Generates a unique id every time it is called
-        The next id is the previous id plus one
-        :return: the next id
-        """
+    def recorded_time(name):
+        _, status, time = outcomes.get(name, (None, None, float('NaN')))
+        return BUILD_TIMEOUT if status == 'timeout' else time
 
-        nonlocal i
-        i += 1
-        return i - 1
+    times = estimate_durations([recorded_time(name) for name, _ in repositories],
+                               [time for _, _, time in outcomes.values()])
+    if times is None:
+        print('No build time recorded yet, the repositories are mined in the order of the input file')
+        return repositories
 
-    i = 0
-    return generate_id
+    repositories, times = lpt_order(repositories, times)
+    print(f'Predicted build time: {format_seconds(predict_makespan(times, jobs))} with {jobs} build processes')
+    return repositories
 
 
-def handle_mvn_project(root):
+def prepare_mvn_project(root):
     """
-    Works on a maven project.
-    Ensures that the project contains the JUnit dependency, injects the JaCoCo dependency, compiles the project and
-    checks the report
+    Prepares a maven project for the build.
+    Ensures that the project contains the JUnit dependency, injects the JaCoCo dependency and downloads the dependencies
     :param root: the root of the project
-    :raise: TimeoutException if the project takes too long to compile (90 minutes)
-    :raise: NonBuildableException if the project is not buildable
-    :return: the time taken for the compilation of the project and the path to the JaCoCo report
     """
 
     pom_file = os.path.join(root, 'pom.xml')
     dependencies = parse_mvn(pom_file)
     inject_mvn_dependency(pom_file, dependencies)
-    status, output, elapsed = run_with_timer(target=compile_mvn_project, args=root, timeout=60 * 90)  # 90 minutes
+    prefetch_dependencies(root, 'mvn')
 
-    if not status:
-        raise TimeoutException()
-    elif not output:
-        raise NonBuildableException()
 
-    report_path = check_mvn_report(root)
-    return elapsed, report_path
+def prepare_gradle_project(root):
+    """
+    Prepares a gradle project for the build.
+    Ensures that the project contains the JUnit dependency, injects the JaCoCo dependency and downloads the dependencies
+    :param root: the root of the project
+    """
+
+    gradle_file = os.path.join(root, 'build.gradle')
+    parse_gradle(gradle_file)
+    inject_gradle_dependency(gradle_file)
+    prefetch_dependencies(root, 'gradle')
 
 
-def handle_gradle_project(root):
+def build_project(root, project, tree, retry=False):
     """
-    Works on a gradle project.
-    Ensures that the project contains the JUnit dependency, injects the JaCoCo dependency, compiles the project and
-    checks the report
+    Compiles a prepared project and checks the report.
+    A project whose tree already failed to build is not built again, unless asked to
     :param root: the root of the project
+    :param project: the type of the project (mvn or gradle)
+    :param tree: the hash of the project tree, see `hash_tree`
+    :param retry: whether to build again a tree that failed to build
     :raise: TimeoutException if the project takes too long to compile (90 minutes)
     :raise: NonBuildableException if the project is not buildable
     :return: the time taken for the compilation of the project and the path to the JaCoCo report
     """
 
-    gradle_file = os.path.join(root, 'build.gradle')
-    parse_gradle(gradle_file)
-    inject_gradle_dependency(gradle_file)
-    status, output, elapsed = run_with_timer(target=compile_gradle_project, args=root, timeout=60 * 90)  # 90 minutes
+    # the project has just been cloned, there is nothing to clean, while online mode lets the build download anything
+    # that the prefetch missed, so that the evaluation can run offline
+    command = build_command(project, clean=False, offline=False)
+    key = build_key(tree, command)
+
+    # the report of a successful build is needed, so only the failures are cached
+    result = None if retry else lookup_build(key, BUILD_TIMEOUT)
+    if result is None or result.exit_code == 0:
+        result = compile_project(root, command, BUILD_TIMEOUT)
+        if result.exit_code != 0:
+            store_build(key, result, BUILD_TIMEOUT)
 
-    if not status:
+    if result.timed_out:
         raise TimeoutException()
-    elif not output:
+    elif result.exit_code != 0:
         raise NonBuildableException()
 
-    report_path = check_gradle_report(root)
-    return elapsed, report_path
+    report_path = check_mvn_report(root) if project == 'mvn' else check_gradle_report(root)
+    return math.ceil(result.wall_time), report_path
 
 
-def analyze(log, method_id_generator, name, repo_id):
+def new_job(name, repo_id, retry=False):
     """
-    Analyzes the project and writes the results to the log file
-    :param log: the log function
-    :param method_id_generator: the method id generator used when parsing the JaCoCo report
+    Creates the state of a repository going through the mining stages. Each repository is cloned and built in its own
+    workspace, `tmp_mine/<repo_id>`
     :param name: the name of the project
     :param repo_id: the id of the repository
+    :param retry: whether to build the repository even if its tree already failed to build
+    :return: the job, a dictionary passed from stage to stage
     """
 
-    formatted_name = reformat_repo_name(name)  # name is now repo__{owner}_{name} (e.g. repo__google_guava)
-    tmp_save_folder = os.path.join(f'tmp_mine', formatted_name)
-    time, report, project_root = float('NaN'), None, None
+    workspace = os.path.join('tmp_mine', str(repo_id))
+    return {
+        'name': name,
+        'repo_id': repo_id,
+        'retry': retry,
+        'workspace': workspace,
+        'folder': os.path.join(workspace, reformat_repo_name(name)),  # repo__{owner}_{name} (e.g. repo__google_guava)
+        'project_root': None,
+        'tree': None,
+        'report': None,
+        'time': float('NaN'),
+        'row': {},  # fields of the repositories.csv row, the status is set as soon as a stage fails
+        'records': [],
+    }
+
+
+def prepare(job):
+    """
+    First stage: clones the latest tag of the repository, looks for the mvn or gradle file and prepares the project
+    for the build, downloading its dependencies
+    :param job: the job of the repository
+    """
 
-    try:
-        # clone and checkout
-        repo = clone_repository(name, tmp_save_folder)
-        tag = extract_tag(repo, log)
-        log(f'{tag},', file='repositories')
+    create_directory_if_needed(job['workspace'])
+    job['row']['tag'] = clone_latest_tag(job['name'], job['folder'])
 
-        # look for mvn or gradle file and handle the project accordingly
-        for root, _, files in os.walk(tmp_save_folder):
-            if 'pom.xml' in files:
-                log('mvn,', file='repositories')
+    for root, _, files in os.walk(job['folder']):
+        if 'pom.xml' in files:
+            job['row']['project'] = 'mvn'
+            job['project_root'] = root
+            prepare_mvn_project(root)
+            job['tree'] = hash_tree(root)
+            return
 
-                project_root = root
-                time, report = handle_mvn_project(root)
-                break
+        elif 'build.gradle' in files:
+            job['row']['project'] = 'gradle'
+            job['project_root'] = root
+            prepare_gradle_project(root)
+            job['tree'] = hash_tree(root)
+            return
 
-            elif 'build.gradle' in files:
-                log('gradle,', file='repositories')
+    raise InvalidProjectException()  # the project is neither a mvn nor a gradle project
 
-                project_root = root
-                time, report = handle_gradle_project(root)
-                break
 
-        if not project_root:
-            log('N/A,', file='repositories')
-            raise InvalidProjectException()  # the project is neither a mvn nor a gradle project
+def build(job):
+    """
+    Second stage: compiles the project, running the tests and creating the JaCoCo report
+    :param job: the job of the repository
+    """
 
-        zip_dir(formatted_name)
+    job['time'], job['report'] = build_project(job['project_root'], job['row']['project'], job['tree'], job['retry'])
 
-        # parse JaCoCo report
-        extract_dataset_methods(log, method_id_generator, project_root, repo_id, report)
 
-        pre_path = '/'.join(project_root.split('/')[2:])
-        log(f'{pre_path},success,{time}', file='repositories')
+def archive(job):
+    """
+    Last stage: archives the repository and extracts the covered methods from the JaCoCo report
+    :param job: the job of the repository
+    """
+
+    formatted_name = reformat_repo_name(job['name'])
+    mark_dependencies_ready(formatted_name)
+    zip_dir(formatted_name, job['workspace'])
+
+    # parse JaCoCo report
+    log, job['records'] = buffered_logger()
+    repo_id = job['repo_id']
+    job['row']['methods'] = extract_dataset_methods(log, id_generator(repo_id), job['project_root'], repo_id,
+                                                    job['report'])
+
+    pre_path = os.path.relpath(job['project_root'], job['folder'])
+    job['row']['root'] = '' if pre_path == '.' else pre_path
+    job['row']['status'] = 'success'
+
+
+def run_stage(stage, job):
+    """
+    Runs a stage on a repository, recording the status of the repository if the stage fails
+    :param stage: the stage function
+    :param job: the job of the repository
+    :return: whether the stage succeeded
+    """
+
+    try:
+        stage(job)
+        return True
 
     except MineException as e:
-        # print(f'{e.cause} {time}')
-        log(f'N/A,{e.cause},{time}', file='repositories')
+        job['row']['status'] = e.cause
 
     except UnzippableError:
-        log(f'N/A,unzippable,{time}', file='repositories')
+        job['row']['status'] = 'unzippable'
 
     except GitCommandError:
-        log(f'N/A,N/A,N/A,', file='repositories')  # log N/A for tag, project and root
-        log(f'clone_timeout,{time}', file='repositories')
+        job['row']['status'] = 'clone_timeout'
 
     except Exception as e:
         print(f'\nUnexpected error:\n{e}\n')
         print(traceback.format_exc())
+        job['row']['status'] = 'error'
 
-    finally:
-        delete_dir(tmp_save_folder)
-        log('\n', file='repositories')
+    return False
+
+
+def close(job):
+    """
+    Deletes the workspace of a repository, whether it was mined or not, and collects its records
+    :param job: the job of the repository
+    :return: the records to write to the resource files
+    """
+
+    delete_dir(job['workspace'])
+
+    # the methods of a failed repository are dropped, it may be mined again with the same ids
+    row = job['row']
+    records = job['records'] if row.get('status') == 'success' else []
+    records.append(('repositories', repository_row(job['repo_id'], job['name'], time=job['time'], **row)))
+    return records
+
+
+def exit_on_terminate():
+    """
+    Makes a terminated stage process exit through Python, so that the build it is running is killed with it (see
+    `utils.timer.run_with_timer`)
+    """
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
 
 
-def mine(input_file):
+def stop_workers(processes, grace=10):
     """
-    Mines the repositories in the input file
+    Terminates the stage processes, killing the ones that do not exit in time
+    :param processes: the stage processes
+    :param grace: the seconds each process is given to exit
+    """
+
+    for p in processes:
+        p.terminate()
+    for p in processes:
+        p.join(grace)
+        if p.is_alive():
+            p.kill()
+            p.join()
+
+
+def stage_worker(stage, inbox, outbox, failed_box):
+    """
+    Process running a stage on the repositories it receives until it receives None
+    :param stage: the stage function
+    :param inbox: the queue of the jobs to process
+    :param outbox: the queue of the next stage
+    :param failed_box: the queue of the last stage, which closes the jobs that failed
+    """
+
+    exit_on_terminate()
+    for job in iter(inbox.get, None):
+        if run_stage(stage, job):
+            outbox.put(job)
+        else:
+            failed_box.put(job)
+
+
+def archive_worker(inbox, results):
+    """
+    Process running the last stage on the repositories it receives until it receives None, then closing them
+    :param inbox: the queue of the jobs to process, some of which already failed
+    :param results: the queue through which the name and the records of each repository are sent to the writer
+    """
+
+    exit_on_terminate()
+    for job in iter(inbox.get, None):
+        if 'status' not in job['row']:
+            run_stage(archive, job)
+        results.put((job['name'], close(job)))
+
+
+def mine(input_file, jobs=1, retry=False):
+    """
+    Mines the repositories in the input file, resuming from the resources of the previous runs: only the repositories
+    that were not mined yet (or whose mining should be retried) are mined, and their results are appended
     :param input_file: the CSV file downloaded from the SEART tool. The important column is only `name`
+    :param jobs: the number of repositories built in parallel, each in its own process
+    :param retry: whether to mine again the repositories that failed in the previous runs
     """
 
     create_working_environment()
+    create_directory_if_needed('resources')
 
     df = pd.read_csv(input_file, usecols=['name'])
 
     # utilities
-    log = logger()
-    generate_method_id = id_generator()
-    bar = ProgressBar(df)
+    log = ResourceLogger()
+
+    # a migrated repositories.csv no longer matches the size saved in the checkpoint of the previous run
+    if os.path.exists('resources/repositories.csv') and migrate_repositories():
+        log.recommit('repositories')
+
+    log.restore()  # drops whatever an interrupted run wrote after its last complete repository
 
-    log('id,name,tag,project,root,status,time\n', file='repositories')
-    log('method_id,repo_id,file,start,end,instruction_coverage,line_coverage\n', file='tracing')
-    log('id,code\n', file='expected')
+    if not os.path.exists('resources/repositories.csv'):
+        log(','.join(REPOSITORIES_HEADER) + '\n', file='repositories')
+        log('method_id,repo_id,file,start,end,instruction_coverage,line_coverage\n', file='tracing')
+        log('id,code\n', file='expected')
+        log.commit()
 
-    # mine the repositories
-    for index, row in df.iterrows():
-        name = row['name']
+    outcomes = read_outcomes()
+    repositories = plan_repositories(df['name'], outcomes, retry)
+    print(f'Mining {len(repositories)} repositories ({len(outcomes)} already in the resources)')
+    repositories = schedule_repositories(repositories, outcomes, jobs)
 
-        log(f'{index},{name},', file='repositories')
-        bar.update(name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        bar.next()
+    bar = ProgressBar(len(repositories))
 
-        analyze(log, generate_method_id, name, index)
+    # mine the repositories: the next repositories are cloned and prepared while the current ones are built, and the
+    # built ones are archived and parsed meanwhile
+    prepare_workers = max(1, math.ceil(jobs * PREPARE_WORKERS))
+    archive_workers = max(1, math.ceil(jobs * ARCHIVE_WORKERS))
 
+    prepare_queue = Queue()
+    build_queue = Queue(maxsize=max(1, math.ceil(jobs * READY_REPOSITORIES)))
+    archive_queue = Queue(maxsize=archive_workers + jobs)
+    results = Queue()
+
+    stages = [(prepare_queue, prepare_workers, stage_worker, (prepare, prepare_queue, build_queue, archive_queue)),
+              (build_queue, jobs, stage_worker, (build, build_queue, archive_queue, archive_queue)),
+              (archive_queue, archive_workers, archive_worker, (archive_queue, results))]
+
+    processes = []
+    completed = False
+    try:
+        for _, workers, target, args in stages:
+            for _ in range(workers):
+                processes.append(Process(target=target, args=args))
+                processes[-1].start()
+
+        for name, repo_id in repositories:
+            prepare_queue.put(new_job(name, repo_id, retry))
+
+        # this process is the only one writing to the resource files
+        for _ in repositories:
+            while True:
+                try:
+                    name, records = results.get(timeout=1)
+                    break
+                except Empty:
+                    bar.poll()
+                    if any(p.exitcode is not None for p in processes):
+                        raise RuntimeError('A mining process died unexpectedly, run the mining again to resume it')
+
+            log.write_records(records)
+            bar.update(name)
+            bar.next()
+
+        completed = True
+
+    finally:
+        if completed:
+            for queue, workers, _, _ in stages:
+                for _ in range(workers):
+                    queue.put(None)
+            for p in processes:
+                p.join()
+        else:
+            # the other processes would wait for jobs forever, and keep this one alive on exit
+            stop_workers(processes)
+
+    log.close()
     bar.finish()
     delete_dir(f'tmp_mine')
@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+from utils.timer import RunResult
+from utils.file_system import is_excluded
+from mine_utils.compilation import BUILD_LIMITS, BUILD_MAX_HEAP
+
+# outcome of every build, by hash of the built tree and of the way it was built, shared by the mining and the evaluation
+BUILD_CACHE = os.path.abspath('build_cache')
+CACHED_OUTPUT = 1 << 12  # characters of output kept for each build, enough for the summary of the tests
+
+# hash of the archives already hashed by this process, by path, size and modification time
+archive_hashes = {}
+
+
+def hash_values(*values):
+    """
+    Hashes a sequence of JSON serializable values
+    :return: the hexadecimal SHA-256 digest
+    """
+
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+
+def hash_file(path: str):
+    """
+    Hashes the content of a file
+    :param path: the path of the file
+    :return: the hexadecimal SHA-256 digest
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_archive(path: str):
+    """
+    Hashes an archive, only reading it the first time
+    :param path: the path of the archive
+    :return: the hexadecimal SHA-256 digest
+    """
+
+    stat = os.stat(path)
+    key = path, stat.st_size, stat.st_mtime_ns
+    if key not in archive_hashes:
+        archive_hashes[key] = hash_file(path)
+    return archive_hashes[key]
+
+
+def hash_tree(root: str):
+    """
+    Hashes the paths and contents of the files of a project, without its caches and build outputs (see
+    `utils.file_system.is_excluded`)
+    :param root: the root directory of the project
+    :return: the hexadecimal SHA-256 digest
+    """
+
+    digest = hashlib.sha256()
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not is_excluded(d, files))
+        for file in sorted(files):
+            path = os.path.join(directory, file)
+            if os.path.isfile(path):
+                digest.update(f'{os.path.relpath(path, root)}\0{hash_file(path)}\0'.encode())
+    return digest.hexdigest()
+
+
+def build_key(tree: str, command: list):
+    """
+    Creates the key of a build, which has the same outcome as any build with the same key
+    :param tree: the hash of the built tree
+    :param command: the build command, as a list of arguments
+    :return: the key of the build
+    """
+
+    return hash_values(tree, command, BUILD_LIMITS, BUILD_MAX_HEAP)
+
+
+def entry_path(key: str):
+    return os.path.join(BUILD_CACHE, key[:2], f'{key}.json')
+
+
+def lookup_build(key: str, timeout: float):
+    """
+    Looks for the outcome of a previous build with the same key
+    :param key: the key of the build, see `build_key`
+    :param timeout: the timeout of the new build, in seconds
+    :return: the RunResult of the previous build if it is also the outcome of the new one, None otherwise
+    """
+
+    try:
+        with open(entry_path(key), 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    previous_timeout = entry.pop('timeout')
+    result = RunResult(**entry)
+
+    # a build that timed out would time out again only without more time, a completed one only completes in time
+    if result.timed_out:
+        return result if timeout <= previous_timeout else None
+    return result if result.wall_time <= timeout else None
+
+
+def store_build(key: str, result: RunResult, timeout: float):
+    """
+    Stores the outcome of a build, unless it could not even start
+    :param key: the key of the build, see `build_key`
+    :param result: the RunResult of the build
+    :param timeout: the timeout of the build, in seconds
+    """
+
+    if result.exit_code is None and not result.timed_out:
+        return
+
+    entry = result._asdict()
+    entry['output'] = entry['output'][-CACHED_OUTPUT:]
+    entry['timeout'] = timeout
+
+    path = entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # written aside and moved, so that concurrent builds never read a partial entry
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
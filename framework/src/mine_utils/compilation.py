@@ -1,44 +1,137 @@
 import os
-from multiprocessing import Value
-from mine_utils.mine_exceptions import NonBuildableException, NoReportException
-
-
-def compile_project(root: str, command: str, expected_output: str, return_value: Value):
+from utils.timer import run_with_timer
+from mine_utils.mine_exceptions import NoReportException
+
+# resource limits applied to every build, see utils.timer.LIMITS. None keeps the limit of the host
+BUILD_LIMITS = {
+    'cpu_time': None,  # seconds
+    'address_space': None,  # bytes, often too strict for the JVM: prefer BUILD_MAX_HEAP
+    'open_files': None,  # e.g., 16384, only ever raises the soft limit
+}
+BUILD_MAX_HEAP = None  # maximum heap of every JVM started by a build (e.g., '4g')
+
+# dependencies downloaded by any build, shared by all of them instead of relying on ~/.m2 and ~/.gradle
+DEPENDENCY_CACHE = os.path.abspath('dependency_cache')
+PREFETCH_TIMEOUT = 60 * 30  # 30 minutes
+
+# gradle has no built-in task downloading all the dependencies of a project
+GRADLE_PREFETCH_SCRIPT = """
+allprojects {
+    task resolveDependencies {
+        doLast {
+            configurations.findAll { it.canBeResolved }.each {
+                try {
+                    it.resolve()
+                } catch (ignored) {
+                }
+            }
+        }
+    }
+}
+"""
+
+
+def compile_project(root: str, command: list, timeout: float):
     """
     Compiles a project using the given command.
     :param root: the root directory of the project
-    :param command: the command to use to compile the project
-    :param expected_output: the expected output of the compilation
-    :param return_value: a multiprocess shared value to store the return value of the compilation
+    :param command: the command to use to compile the project, as a list of arguments
+    :param timeout: the maximum time allowed for the build, in seconds
+    :return: the RunResult of the build, which succeeded if its exit code is 0
     """
 
-    try:
-        output = os.popen(f'cd {root}; {command} 2>&1').read()
-        return_value.value = expected_output in output
-    except (ValueError, UnicodeError):
-        return_value.value = False
+    return run_with_timer(command, root, timeout, BUILD_LIMITS, BUILD_MAX_HEAP)
 
 
-def compile_mvn_project(root: str, return_value: Value):
+def mvn_command(clean: bool, offline: bool):
     """
-    Compiles a maven project
-    :param root: the root directory of the project
-    :param return_value: a multiprocess shared value to store the return value of the compilation
+    Creates the maven command that compiles the project, runs the tests and creates the JaCoCo report in one go
+    :param clean: whether to delete the previous build outputs first (not needed in a fresh workspace)
+    :param offline: whether maven is not allowed to download anything
+    :return: the command as a list of arguments
+    """
+
+    command = ['mvn', '-B', '-T', '1C', f'-Dmaven.repo.local={os.path.join(DEPENDENCY_CACHE, "maven")}']
+    if offline:
+        command.append('-o')
+    if clean:
+        command.append('clean')
+    return command + ['test']
+
+
+def gradle_command(clean: bool, offline: bool):
+    """
+    Creates the gradle command that compiles the project, runs the tests and creates the JaCoCo report in one go
+    :param clean: whether to delete the previous build outputs first (not needed in a fresh workspace)
+    :param offline: whether gradle is not allowed to download anything
+    :return: the command as a list of arguments
+    """
+
+    # without the daemon, no gradle process outlives the build
+    command = ['gradle', '--no-daemon', '--gradle-user-home', os.path.join(DEPENDENCY_CACHE, 'gradle')]
+    if offline:
+        command.append('--offline')
+    if clean:
+        command.append('clean')
+    return command + ['build']
+
+
+def build_command(project: str, clean: bool, offline: bool):
+    """
+    Creates the command that builds a project
+    :param project: the type of the project (mvn or gradle)
+    :param clean: whether to delete the previous build outputs first
+    :param offline: whether the build is not allowed to download anything
+    :return: the command as a list of arguments
     """
 
-    compile_project(root, 'mvn clean install -DskipTests', 'BUILD SUCCESS', return_value)
-    output = os.popen(f'cd {root}; mvn test 2>&1').read()
-    return_value.value = 'BUILD SUCCESS' in output
+    return mvn_command(clean, offline) if project == 'mvn' else gradle_command(clean, offline)
 
 
-def compile_gradle_project(root: str, return_value: Value):
+def prefetch_dependencies(root: str, project: str):
     """
-    Compiles a gradle project
+    Downloads the dependencies and plugins of a project into the dependency cache, so that the following builds can
+    run offline
     :param root: the root directory of the project
-    :param return_value: a multiprocess shared value to store the return value of the compilation
+    :param project: the type of the project (mvn or gradle)
+    :return: the RunResult of the download
+    """
+
+    if project == 'mvn':
+        command = mvn_command(clean=False, offline=False)[:-1] + ['dependency:go-offline']
+    else:
+        script = os.path.join(DEPENDENCY_CACHE, 'prefetch.gradle')
+        if not os.path.exists(script):
+            os.makedirs(DEPENDENCY_CACHE, exist_ok=True)
+            with open(script, 'w') as f:
+                f.write(GRADLE_PREFETCH_SCRIPT)
+        command = gradle_command(clean=False, offline=False)[:-1] + ['--init-script', script, 'resolveDependencies']
+
+    return compile_project(root, command, PREFETCH_TIMEOUT)
+
+
+def ready_marker(repo_name: str):
+    return os.path.join(DEPENDENCY_CACHE, 'ready', repo_name)
+
+
+def dependencies_ready(repo_name: str):
+    """
+    Checks whether the dependencies of a repository have already been downloaded into the cache
+    :param repo_name: the formatted name of the repository
+    :return: True if a previous build of the repository filled the cache
+    """
+
+    return os.path.exists(ready_marker(repo_name))
+
+
+def mark_dependencies_ready(repo_name: str):
+    """
+    Records that the dependencies of a repository are in the cache
+    :param repo_name: the formatted name of the repository
     """
 
-    compile_project(root, 'gradle clean build', 'BUILD SUCCESSFUL', return_value)
+    os.makedirs(os.path.dirname(ready_marker(repo_name)), exist_ok=True)
+    open(ready_marker(repo_name), 'w').close()
 
 
 def check_mvn_report(root: str):
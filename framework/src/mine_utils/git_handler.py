@@ -1,7 +1,15 @@
 from git import Repo
 from git.cmd import Git
+from git.exc import GitCommandError
+from utils.file_system import delete_dir
 from mine_utils.mine_exceptions import MissingTagException
 
+TIMEOUT = 300  # 300 seconds (5 minutes) for each git command
+
+
+def repository_url(name: str):
+    return Git.polish_url(f'https://www.github.com/{name}')
+
 
 def clone_repository(name: str, save_folder: str):
     """
@@ -11,22 +19,17 @@ def clone_repository(name: str, save_folder: str):
     :return: the cloned repository object
     """
 
-    url = f'https://www.github.com/{name}'
-
     g = Git(save_folder)
-    timeout = 300  # 300 seconds (5 minutes)
-
-    g.clone(Git.polish_url(url), save_folder, kill_after_timeout=timeout)
+    g.clone(repository_url(name), save_folder, kill_after_timeout=TIMEOUT)
     repo = Repo.init(save_folder)
 
     return repo
 
 
-def extract_tag(repo: Repo, log):
+def extract_tag(repo: Repo):
     """
     Extract the latest snapshot/tag from the repository and checkout it
     :param repo: The cloned repo object
-    :param log: The logger function
     :raise: MissingTagException if no tag is found
     :return: The tag name
     """
@@ -39,7 +42,80 @@ def extract_tag(repo: Repo, log):
 
         repo.git.checkout(f'tags/{tag}')
     except (ValueError, IndexError):
-        log(f'N/A,N/A,', file='repositories')  # log N/A for tag and project
         raise MissingTagException()
 
-    return tag
+    return tag.name
+
+
+def timed_out(error: GitCommandError):
+    """
+    Checks whether a git command failed because it was killed after TIMEOUT (kill_after_timeout)
+    :param error: the error raised by the git command
+    :return: True if the command was killed by a signal, False if git itself failed
+    """
+
+    return isinstance(error.status, int) and error.status < 0
+
+
+def resolve_latest_tag(url: str, metadata_folder: str):
+    """
+    Finds the latest tag of a remote repository, i.e., the tag whose commit was committed last, without downloading the
+    files of the repository: only its commits and tags are cloned (treeless clone), and the commit date of every tag is
+    read with a single for-each-ref
+    :param url: the url of the repository
+    :param metadata_folder: the folder where the commits and tags are cloned
+    :return: the name of the latest tag, None if the repository has no tag
+    """
+
+    Git().clone(url, metadata_folder, bare=True, filter='tree:0', kill_after_timeout=TIMEOUT)
+
+    # the commit date is set for lightweight tags, the date of the peeled commit (*) for annotated tags
+    refs = Git(metadata_folder).for_each_ref('refs/tags', format='%(refname:strip=2) %(committerdate:unix) '
+                                                                 '%(*committerdate:unix)')
+
+    tags = []
+    for line in refs.splitlines():
+        name, date, peeled_date = line.split(' ')
+        if date or peeled_date:  # tags of trees or blobs have no commit
+            tags.append((name, int(date or peeled_date)))
+
+    if not tags:
+        return None
+
+    tags.sort(key=lambda t: t[1])
+    return tags[-1][0]
+
+
+def clone_latest_tag(name: str, save_folder: str):
+    """
+    Clone the latest snapshot/tag of a GitHub repository into a local folder.
+    The tag is resolved from the commits and tags alone, then only the tag is cloned, at depth 1. If the server does
+    not support it, the whole repository is cloned and the tag is checked out. A timeout is not retried with the whole
+    repository, which would only take longer
+    :param name: the name of the repository
+    :param save_folder: the folder to save the repository
+    :raise: MissingTagException if no tag is found
+    :raise: GitCommandError if the repository cannot be cloned
+    :return: The tag name
+    """
+
+    url = repository_url(name)
+    metadata_folder = f'{save_folder}__tags'
+
+    try:
+        tag = resolve_latest_tag(url, metadata_folder)
+        if tag is None:
+            raise MissingTagException()
+
+        Git().clone(url, save_folder, branch=tag, depth=1, kill_after_timeout=TIMEOUT)
+        return tag
+
+    except GitCommandError as e:
+        if timed_out(e):
+            raise
+
+        delete_dir(save_folder)
+        return extract_tag(clone_repository(name, save_folder))
+
+    finally:
+        delete_dir(metadata_folder)
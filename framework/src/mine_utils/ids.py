@@ -0,0 +1,53 @@
+from mine_utils.mine_exceptions import TooManyMethodsException
+
+SEQUENCE_BITS = 20  # up to ~1 million methods per repository
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def pack_method_id(repo_id: int, sequence: int):
+    """
+    Packs the id of a repository and the position of a method inside it into a single method id
+    :param repo_id: the id of the repository inside the repositories.csv file
+    :param sequence: the position of the method inside the repository
+    :raise TooManyMethodsException: if the sequence does not fit in `SEQUENCE_BITS` bits
+    :return: the method id
+    """
+
+    if sequence > MAX_SEQUENCE:
+        raise TooManyMethodsException()
+    return (int(repo_id) << SEQUENCE_BITS) | sequence
+
+
+def unpack_method_id(method_id: int):
+    """
+    Splits a method id into the id of its repository and its position inside the repository
+    :param method_id: the method id
+    :return: a tuple with the id of the repository and the sequence of the method
+    """
+
+    method_id = int(method_id)
+    return method_id >> SEQUENCE_BITS, method_id & MAX_SEQUENCE
+
+
+def id_generator(repo_id: int):
+    """
+    Creates a unique id generator for the methods of a repository
+    The ids only depend on the repository and on the order of its methods, so they can be generated by any process
+    (or machine) without coordination
+    :param repo_id: the id of the repository inside the repositories.csv file
+    :return: the id generator
+    """
+
+    def generate_id():
+        """
+        Generates a unique id every time it is called
+        The next id is the previous id plus one
+        :return: the next id
+        """
+
+        nonlocal i
+        i += 1
+        return pack_method_id(repo_id, i - 1)
+
+    i = 0
+    return generate_id
@@ -1,7 +1,12 @@
 import os
-from collections import Counter
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
 from xml.etree import ElementTree
 
+# comments, strings and character literals (skipped as a whole) and curly brackets
+TOKEN_PATTERN = re.compile(r'//[^\n]*|/\*[\s\S]*?\*/|"""[\s\S]*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|[{}]')
+
 
 class ParsingException(Exception):
     """
@@ -10,25 +15,35 @@ class ParsingException(Exception):
     pass
 
 
-def cover_percentage(counters: list, relevant_type: str):
+def cover_percentage(counters: dict, relevant_type: str):
     """
     Calculates the percentage of a given type of coverage
-    :param counters: the list of counters found in the report
+    :param counters: the counters found in the report, mapping each type to its (missed, covered) values
     :param relevant_type: the type of coverage to consider ('INSTRUCTION', 'LINE)
     :return: a formatted string with the percentage of coverage (e.g. '50.00')
     """
 
-    counter = [c for c in counters if c.get('type') == relevant_type][0]
-    covered = int(counter.get('covered'))
-    missed = int(counter.get('missed'))
+    missed, covered = counters[relevant_type]
     return f'{covered / (covered + missed) * 100:.2f}'
 
 
+def read_counters(method):
+    """
+    Reads all the counters of a method in one pass
+    :param method: the method element of the report
+    :return: a dictionary mapping each type of counter (e.g. 'METHOD', 'LINE') to its (missed, covered) values
+    """
+
+    return {c.get('type'): (int(c.get('missed')), int(c.get('covered'))) for c in method.iter('counter')}
+
+
 def parse_jacoco_report(report_file: str):
     """
     Parses a JaCoCo report and extract all the methods inside the project that are covered by at least on test
+    The report is streamed: each element is discarded as soon as it has been processed, so that the memory used does
+    not depend on the size of the report
     :param report_file: the path to the report file
-    :return: a list where each covered method is represented by a tuple:
+    :return: a generator where each covered method is represented by a tuple:
         - package name / path (e.g. 'com/example/myproject')
         - file name (e.g. 'MyClass.java')
         - line number where the method starts (e.g. 10)
@@ -37,139 +52,218 @@ def parse_jacoco_report(report_file: str):
         - line coverage (e.g. '70.00')
     """
 
+    package_name, class_name, source_file = None, None, None
+
     try:
-        tree = ElementTree.parse(report_file)
+        for event, element in ElementTree.iterparse(report_file, events=('start', 'end')):
+            tag = element.tag
+
+            if event == 'start':
+                if tag == 'package':
+                    package_name = str(element.get('name'))
+                elif tag == 'class':
+                    class_name = str(element.get('name'))
+                    source_file = str(element.get('sourcefilename'))
+                continue
+
+            if tag == 'method':
+                covered_method = parse_method(element, package_name, class_name, source_file)
+                element.clear()
+                if covered_method is not None:
+                    yield covered_method
+            elif tag in ('class', 'sourcefile', 'package'):
+                element.clear()
     except ElementTree.ParseError:
-        return []
-
-    root = tree.getroot()
-    packages = root.findall('package')
-
-    covered_methods = []
-
-    for package in packages:
-        package_name = str(package.get('name'))
-        classes = package.findall('class')
-        for class_ in classes:
-            class_name = str(class_.get('name'))
-            source_file = str(class_.get('sourcefilename'))
-            methods = class_.findall('method')
-
-            for method in list(methods):
-                method_name = str(method.get('name'))
-                if method_name == '<init>':
-                    method_name = class_name.split('/')[-1]
-                    method_name = method_name.split('$')[-1]
-                elif method_name == '<clinit>':
-                    continue
-                try:
-                    method_line = int(method.get('line'))
-                except TypeError:
-                    continue
-
-                # use the 'METHOD' counter to check if the method is covered
-                counters = method.findall('counter')
-                method_counter = [c for c in counters if c.get('type') == 'METHOD'][0]
-                covered = int(method_counter.get('covered'))
-
-                if covered > 0:
-                    # use the 'INSTRUCTION' and 'LINE' counters to calculate the coverage
-                    instruction_cover = cover_percentage(counters, 'INSTRUCTION')
-                    line_cover = cover_percentage(counters, 'LINE')
-
-                    covered_methods.append(
-                        (package_name, source_file, method_line, method_name, instruction_cover, line_cover)
-                    )
-
-    return covered_methods
-
-
-def isolate_method(lines, start, method_name):
-    """
-    Find the exact lines where the method starts and ends
-    :param lines: the lines of the source code
-    :param start: the presumed start line of the method (JaCoCo is inconsistent in its reporting)
-    :param method_name: the name of the method
-    :raise ParsingException: if the method cannot be found
-    :return: a tuple:
-        - the code of the method where the lines are replaced by the <NEW_LINE> token
-        - the start line of the method
-        - the end line of the method
-    """
-
-    # find the line where the method starts
-    while method_name not in lines[start]:
-        start -= 1
-    lines = lines[start:]
-
-    end = 0
-    bracket_count = 0
-    method_started = False
-
-    # find the line where the method ends by counting the curly brackets
-    while bracket_count != 0 or not method_started:
-        lines[end] = lines[end].strip()
-        for char in lines[end]:
-            if char == '{':
-                method_started = True
-                bracket_count += 1
-            elif char == '}':
-                bracket_count -= 1
-        end += 1
-    lines = lines[:end]
-
-    # replace the lines by the <NEW_LINE> token and ensure the parsing is correct
-    output = ' <NEW_LINE> '.join(lines)
-    counter = Counter(output)
-    if counter['{'] != counter['}']:
-        raise ParsingException('Bracket mismatch')
-    if output[-1] != '}':
-        raise ParsingException('Missing closing bracket')
-    if len(output.split('<NEW_LINE>')) >= 50:
-        raise ParsingException('Method too long')
-
-    return output, start, start + end
+        return
+
+
+def parse_method(method, package_name: str, class_name: str, source_file: str):
+    """
+    Extracts a method from the report if it is covered by at least one test
+    :param method: the method element of the report
+    :param package_name: the name of the package containing the method
+    :param class_name: the name of the class containing the method
+    :param source_file: the name of the file containing the class
+    :return: the tuple representing the method (see `parse_jacoco_report`), or None if it is not covered
+    """
+
+    method_name = str(method.get('name'))
+    if method_name == '<init>':
+        method_name = class_name.split('/')[-1]
+        method_name = method_name.split('$')[-1]
+    elif method_name == '<clinit>':
+        return None
+    try:
+        method_line = int(method.get('line'))
+    except TypeError:
+        return None
+
+    # use the 'METHOD' counter to check if the method is covered
+    counters = read_counters(method)
+    _, covered = counters['METHOD']
+    if covered == 0:
+        return None
+
+    # use the 'INSTRUCTION' and 'LINE' counters to calculate the coverage
+    instruction_cover = cover_percentage(counters, 'INSTRUCTION')
+    line_cover = cover_percentage(counters, 'LINE')
+    return package_name, source_file, method_line, method_name, instruction_cover, line_cover
+
+
+class SourceFile:
+    """
+    Source file of a project, scanned once to locate all the methods reported by JaCoCo inside it.
+    The scan skips comments, strings and character literals, and records the depth of curly brackets at the start of
+    each line, so that the end of a method is found with a binary search instead of a scan
+    """
+
+    def __init__(self, lines):
+        """
+        :param lines: the lines of the source code
+        """
+
+        self.lines = lines
+
+        line_starts = [0]
+        for line in lines[:-1]:
+            line_starts.append(line_starts[-1] + len(line))
+
+        # net change in depth and whether there is an opening bracket, for each line
+        deltas = [0] * len(lines)
+        opens = [False] * len(lines)
+        for match in TOKEN_PATTERN.finditer(''.join(lines)):
+            token = match.group()
+            if token == '{' or token == '}':
+                line = bisect_right(line_starts, match.start()) - 1
+                if token == '{':
+                    deltas[line] += 1
+                    opens[line] = True
+                else:
+                    deltas[line] -= 1
+
+        # depths[i] is the depth at the start of line i (depths[len(lines)] is the depth at the end of the file)
+        self.depths = [0] * (len(lines) + 1)
+        for i, delta in enumerate(deltas):
+            self.depths[i + 1] = self.depths[i] + delta
+
+        # for each depth, the lines at whose end that depth is reached (sorted)
+        self.line_ends = defaultdict(list)
+        for i in range(len(lines)):
+            self.line_ends[self.depths[i + 1]].append(i)
+
+        # first line with an opening bracket at or after each line
+        self.next_open = [len(lines)] * (len(lines) + 1)
+        for i in range(len(lines) - 1, -1, -1):
+            self.next_open[i] = i if opens[i] else self.next_open[i + 1]
+
+    def isolate_method(self, start, method_name):
+        """
+        Find the exact lines where the method starts and ends
+        :param start: the presumed start line of the method (JaCoCo is inconsistent in its reporting)
+        :param method_name: the name of the method
+        :raise ParsingException: if the method cannot be found
+        :return: a tuple:
+            - the code of the method where the lines are replaced by the <NEW_LINE> token
+            - the start line of the method
+            - the end line of the method
+        """
+
+        # find the line where the method starts
+        if not 0 <= start < len(self.lines):
+            raise ParsingException('Start line outside of the file')
+        while method_name not in self.lines[start]:
+            start -= 1
+            if start < 0:
+                raise ParsingException('Method not found')
+
+        # the method ends with the first line, from its first opening bracket on, that goes back to the initial depth
+        first_open = self.next_open[start]
+        candidates = self.line_ends[self.depths[start]]
+        position = bisect_left(candidates, first_open)
+        if first_open == len(self.lines) or position == len(candidates):
+            raise ParsingException('Method not closed')
+        end = candidates[position] + 1
+
+        # replace the lines by the <NEW_LINE> token and ensure the parsing is correct
+        output = ' <NEW_LINE> '.join(line.strip() for line in self.lines[start:end])
+        counter = Counter(output)
+        if counter['{'] != counter['}']:
+            raise ParsingException('Bracket mismatch')
+        if output[-1] != '}':
+            raise ParsingException('Missing closing bracket')
+        if len(output.split('<NEW_LINE>')) >= 50:
+            raise ParsingException('Method too long')
+
+        return output, start, end
+
+
+def index_java_files(repository):
+    """
+    Lists all the java files of a project once, so that the files reported by JaCoCo can be found without probing the
+    file system
+    :param repository: the base path of the repository
+    :return: the set of the paths of the java files, relative to the repository
+    """
+
+    java_files = set()
+    for root, directories, files in os.walk(repository):
+        directories[:] = [d for d in directories if d != '.git']
+        relative_root = os.path.relpath(root, repository)
+        for file in files:
+            if file.endswith('.java'):
+                java_files.add(os.path.normpath(os.path.join(relative_root, file)))
+    return java_files
 
 
 def extract_dataset_methods(log, id_generator, repository, repo_id, jacoco_path):
     """
     Parses the jacoco report and extracts the methods that are covered
+    Each source file is read and scanned only once, for all of its covered methods
     :param log: the logger function
     :param id_generator: the id generator function
     :param repository: the base path of the repository
     :param repo_id: the id of the repository inside the repositories.csv file
     :param jacoco_path: the path to the jacoco report
+    :return: the number of extracted methods
     """
 
     report_path = os.path.join(repository, jacoco_path)
-    covered_methods = parse_jacoco_report(report_path)
+    java_files = index_java_files(repository)
 
     possible_src_directories = ['src', 'src/main/java', 'src/main/resources', 'app', 'app/src/main/java']
+    extracted = 0
 
-    for method in covered_methods:
-        package_name, file_name, line_number, method_name, instruction_cover, line_cover = method
+    # group the covered methods by source file, keeping the order of the report
+    files = defaultdict(list)
+    for package_name, file_name, line_number, method_name, instruction_cover, line_cover in \
+            parse_jacoco_report(report_path):
+        files[(package_name, file_name)].append((line_number, method_name, instruction_cover, line_cover))
 
+    for (package_name, file_name), methods in files.items():
         src_dir = None
         for candidate_src_dir in possible_src_directories:
-            file_path = os.path.join(repository, candidate_src_dir, package_name, file_name)
-            if os.path.isfile(file_path):
+            if os.path.normpath(os.path.join(candidate_src_dir, package_name, file_name)) in java_files:
                 src_dir = candidate_src_dir
                 break
 
-        if src_dir is not None:
-            file_path = os.path.join(repository, src_dir, package_name, file_name)
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
+        if src_dir is None:
+            continue
+
+        file = os.path.join(src_dir, package_name, file_name)
+        with open(os.path.join(repository, file), 'r') as f:
+            source = SourceFile(f.readlines())
+
+        for line_number, method_name, instruction_cover, line_cover in methods:
+            try:
+                output, start, end = source.isolate_method(line_number, method_name)
+            except ParsingException:
+                continue
 
-                try:
-                    output, start, end = isolate_method(lines, line_number, method_name)
-                    output = output.replace('"', '""')
+            output = output.replace('"', '""')
+            method_id = id_generator()
 
-                    method_id = id_generator()
+            log(f'{method_id},"{output}"\n', file='expected')
+            log(f'{method_id},{repo_id},{file},{start},{end},{instruction_cover},{line_cover}\n', file='tracing')
+            extracted += 1
 
-                    file = os.path.join(src_dir, package_name, file_name)
-                    log(f'{method_id},"{output}"\n', file='expected')
-                    log(f'{method_id},{repo_id},{file},{start},{end},{instruction_cover},{line_cover}\n',
-                        file='tracing')
-                except (IndexError, ParsingException):
-                    continue
+    return extracted
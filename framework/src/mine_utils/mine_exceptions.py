@@ -59,3 +59,12 @@ class InvalidProjectException(MineException):
 
     def __init__(self):
         self.cause = 'invalid_project'
+
+
+class TooManyMethodsException(MineException):
+    """
+    Raised if the project has more covered methods than the ones that can be given an id
+    """
+
+    def __init__(self):
+        self.cause = 'too_many_methods'
@@ -1,5 +1,14 @@
+import io
 import os
 import shutil
+import zipfile
+
+# directories never archived: version control, caches and the outputs of the build file they are next to
+SKIPPED_DIRECTORIES = {'.git', '.gradle'}
+BUILD_OUTPUTS = {'pom.xml': 'target', 'build.gradle': 'build', 'build.gradle.kts': 'build'}
+
+# the archives are read back right away (parsing, evaluation), so by default they are not compressed
+ARCHIVE_COMPRESSION = zipfile.ZIP_STORED
 
 
 class UnzippableError(Exception):
@@ -39,30 +48,85 @@ def delete_dir(directory):
 
 
 def create_working_environment():
-    delete_dir('resources')
+    # the resources of the previous runs are kept, mining resumes from them
     delete_dir('tmp_mine')
     create_directory_if_needed('resources')
     create_directory_if_needed(f'tmp_mine')
 
 
-def zip_dir(repo_name):
+def is_excluded(directory, siblings):
+    """
+    Checks whether a directory is left out of the archives
+    :param directory: the name of the directory
+    :param siblings: the names of the files next to it
+    :return: True if the directory is a cache or a build output
+    """
+
+    if directory in SKIPPED_DIRECTORIES:
+        return True
+    return any(BUILD_OUTPUTS[file] == directory for file in siblings if file in BUILD_OUTPUTS)
+
+
+def zip_dir(repo_name, workspace='tmp_mine', compression=ARCHIVE_COMPRESSION):
     """
-    Remove the .git folder, zip the directory and move it to the output directory
+    Zip the directory, without its caches and build outputs (see `is_excluded`), into the output directory
     :param repo_name: the repo name
+    :param workspace: the directory the repo was cloned into
+    :param compression: the zipfile compression method (e.g., zipfile.ZIP_DEFLATED for smaller archives)
     :raise UnzippableError: if the directory contains timestamps before the 1980s and is therefore unzippable
     """
 
-    delete_dir(os.path.join(f'tmp_mine', repo_name, '.git'))
+    archive = os.path.join('resources', f'{repo_name}.zip')
     try:
-        shutil.make_archive(os.path.join('resources', repo_name), 'zip', f'tmp_mine', repo_name)
+        with zipfile.ZipFile(archive, 'w', compression) as zf:
+            for root, dirs, files in os.walk(os.path.join(workspace, repo_name)):
+                dirs[:] = [d for d in dirs if not is_excluded(d, files)]
+
+                archive_root = os.path.relpath(root, workspace)
+                zf.write(root, archive_root)
+                for file in files:
+                    path = os.path.join(root, file)
+                    if os.path.isfile(path):
+                        zf.write(path, os.path.join(archive_root, file))
     except ValueError:
+        os.remove(archive)
         raise UnzippableError()
 
 
-def unzip_dir(repo_name):
+def unzip_dir(repo_name, root=''):
     """
-    Unzip a mined directory
+    Unzip the project of a mined directory, i.e., only the files below its root, without caches and build outputs (which
+    the archives of older versions contain)
     :param repo_name: the formatted name of the repo to unzip
+    :param root: the root of the project inside the repository
+    """
+
+    prefix = f'{os.path.join(repo_name, root).rstrip("/")}/'
+
+    with zipfile.ZipFile(f'resources/{repo_name}.zip') as zf:
+        names = [name for name in zf.namelist() if name.startswith(prefix)]
+
+        # files of each directory, to find the build outputs
+        files = {}
+        for name in names:
+            directory, _, file = name.rstrip('/').rpartition('/')
+            files.setdefault(directory, set()).add(file)
+
+        def excluded(name):
+            parts = name.rstrip('/').split('/')
+            return any(is_excluded(parts[i], files.get('/'.join(parts[:i]), ())) for i in range(1, len(parts)))
+
+        zf.extractall('tmp_evaluate', [name for name in names if not excluded(name)])
+
+
+def read_archived_lines(repo_name, path):
+    """
+    Read a text file of a mined directory without unzipping it
+    :param repo_name: the formatted name of the repo
+    :param path: the path of the file inside the repo
+    :return: the lines of the file
     """
 
-    shutil.unpack_archive(f'resources/{repo_name}.zip', 'tmp_evaluate', 'zip')
+    with zipfile.ZipFile(f'resources/{repo_name}.zip') as zf:
+        with io.TextIOWrapper(zf.open(os.path.normpath(os.path.join(repo_name, path)))) as f:
+            return f.readlines()
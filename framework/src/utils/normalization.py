@@ -0,0 +1,16 @@
+import re
+
+# whitespace and <NEW_LINE> tokens are collapsed in a single pass
+CLEAN_PATTERN = re.compile(r'(?:\s|<NEW_LINE>)+')
+
+
+def clean_series(series):
+    """
+    Removes all <NEW_LINE> tokens and cleans the strings from excess whitespaces, working on a whole pandas Series of
+    strings at once
+    :param series: the strings to clean
+    :return: the cleaned strings
+    """
+
+    # the compiled pattern keeps Python's regex semantics also on Arrow-backed string columns
+    return series.str.strip().str.replace(CLEAN_PATTERN, ' ', regex=True)
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import atexit
+
+
+class ResourceLogger:
+    """
+    Single writer of the resource files.
+    The files are kept open with large buffers and flushed when enough data is pending or enough time has passed since
+    the last flush, as well as when the logger is closed (at the latest, on exit).
+    After each batch of records, the size of every file is saved in a checkpoint, so that the records of a batch
+    interrupted halfway can be discarded with `restore`
+    """
+
+    def __init__(self, directory='resources', buffer_size=1 << 20, flush_size=1 << 20, flush_interval=10):
+        """
+        :param directory: the directory containing the resource files
+        :param buffer_size: the size of the buffer of each file
+        :param flush_size: how many characters can be pending before flushing the files
+        :param flush_interval: how many seconds can pass before flushing the files
+        """
+
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self.files = {}
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+        self.checkpoint_path = os.path.join(directory, 'checkpoint.json')
+        self.checkpoint = {}
+
+        atexit.register(self.close)
+
+    def __call__(self, msg, file):
+        """
+        Writes a record to a resource file. Each record must be complete (e.g., a whole row)
+        :param msg: the record to write
+        :param file: the name of the resource file, without extension
+        """
+
+        if file not in self.files:
+            path = os.path.join(self.directory, f'{file}.csv')
+            self.files[file] = open(path, 'a', buffering=self.buffer_size)
+        self.files[file].write(msg)
+
+        self.pending += len(msg)
+        if self.pending >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_records(self, records):
+        """
+        Writes a batch of records and commits it
+        :param records: a list of (file, message) tuples
+        """
+
+        for file, msg in records:
+            self(msg, file)
+        self.commit()
+
+    def commit(self):
+        """
+        Flushes the files and saves their size as the new checkpoint
+        """
+
+        self.flush()
+        for file, f in self.files.items():
+            self.checkpoint[file] = f.tell()
+        self.save_checkpoint()
+
+    def recommit(self, file):
+        """
+        Saves the current size of a resource file rewritten outside of the logger (e.g., migrated to a new format) as
+        its checkpoint, since the size saved before refers to the old content
+        :param file: the name of the resource file, without extension
+        """
+
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as f:
+                self.checkpoint = json.load(f)
+
+        self.checkpoint[file] = os.path.getsize(os.path.join(self.directory, f'{file}.csv'))
+        self.save_checkpoint()
+
+    def save_checkpoint(self):
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def restore(self):
+        """
+        Truncates the files to the last checkpoint, dropping the records written after it (e.g., part of the batch that
+        was being written when the previous run was interrupted). Files without a checkpoint are left as they are
+        """
+
+        if not os.path.exists(self.checkpoint_path):
+            return
+
+        with open(self.checkpoint_path, 'r') as f:
+            self.checkpoint = json.load(f)
+
+        for file, size in self.checkpoint.items():
+            path = os.path.join(self.directory, f'{file}.csv')
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self.pending = 0
@@ -0,0 +1,48 @@
+import heapq
+import statistics
+
+
+def estimate_durations(durations, history=None):
+    """
+    Fills in the unknown durations with the median of the known ones
+    :param durations: the durations of the items, NaN or None when unknown
+    :param history: the durations the median is computed on, by default the durations themselves
+    :return: the list of the durations, None if no duration is known
+    """
+
+    def is_known(d):
+        return d is not None and d == d  # NaN is not equal to itself
+
+    known = [d for d in (durations if history is None else history) if is_known(d)]
+    if not known:
+        return None
+
+    estimate = statistics.median(known)
+    return [d if is_known(d) else estimate for d in durations]
+
+
+def lpt_order(items, durations):
+    """
+    Orders the items longest-processing-time first: the long items start early, and the short ones fill the gaps at the
+    end, so that the workers finish at about the same time
+    :param items: the items to schedule
+    :param durations: the (estimated) duration of each item
+    :return: the items and their durations, longest first. Items with the same duration keep their order
+    """
+
+    order = sorted(range(len(items)), key=lambda i: -durations[i])
+    return [items[i] for i in order], [durations[i] for i in order]
+
+
+def predict_makespan(durations, workers):
+    """
+    Predicts the time needed to process the items in order, each worker taking the next item as soon as it is free
+    :param durations: the (estimated) duration of each item, in processing order
+    :param workers: the number of workers
+    :return: the time at which the last worker finishes
+    """
+
+    finish_times = [0] * max(1, workers)
+    for duration in durations:
+        heapq.heapreplace(finish_times, finish_times[0] + duration)
+    return max(finish_times)
@@ -1,32 +1,114 @@
+import os
 import time
-import math
-from multiprocessing import Process, Value
+import signal
+import resource
+import tempfile
+import subprocess
+from collections import namedtuple
 
+TAIL_SIZE = 1 << 16  # bytes of output kept from the end of a run
+KILL_GRACE = 10  # seconds between SIGTERM and SIGKILL
 
-def run_with_timer(target, args, timeout):
+RunResult = namedtuple('RunResult', ['exit_code', 'timed_out', 'output', 'wall_time', 'cpu_time'])
+
+# rlimit of each supported limit
+LIMITS = {
+    'cpu_time': resource.RLIMIT_CPU,
+    'address_space': resource.RLIMIT_AS,
+    'open_files': resource.RLIMIT_NOFILE,
+}
+
+# limits that are a minimum the command needs rather than a cap: they are never set below the current soft limit
+RAISE_ONLY = {'open_files'}
+
+
+def set_limits(limits):
+    """
+    Creates the function applying the resource limits inside the child process, right before the command is executed.
+    Only the soft limits are changed, so the hard limits of the host are kept for the whole process tree
+    :param limits: a dictionary mapping the names in `LIMITS` to their value (seconds, bytes or number of files)
+    :return: the function to pass as `preexec_fn`
+    """
+
+    def apply():
+        for name, value in limits.items():
+            if value is not None:
+                soft, hard = resource.getrlimit(LIMITS[name])
+                # a soft limit cannot be raised above the hard limit without privileges
+                if hard != resource.RLIM_INFINITY:
+                    value = min(value, hard)
+                if name in RAISE_ONLY and (soft == resource.RLIM_INFINITY or soft > value):
+                    continue
+                resource.setrlimit(LIMITS[name], (value, hard))
+
+    return apply
+
+
+def kill_group(pid, sig):
     """
-    Run a function with a timeout
-    :param target: a function supported by multiprocessing that returns a boolean value
-    :param args: the arguments to pass to the function
+    Sends a signal to every process of a process group, ignoring groups that no longer exist
+    :param pid: the id of the process group (i.e., the id of its leader)
+    :param sig: the signal to send
+    """
+
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def children_cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_with_timer(command, cwd, timeout, limits=None, max_heap=None):
+    """
+    Run a command with a timeout, in its own process group so that the whole process tree (e.g., maven and the JVMs it
+    forks for the tests) can be killed on timeout, and no process outlives the run
+    :param command: the command to run, as a list of arguments
+    :param cwd: the directory where to run the command
     :param timeout: the timeout in seconds
-    :return: a tuple of the function successfulness, its result and the time taken
+    :param limits: optional resource limits, see `LIMITS`
+    :param max_heap: optional maximum heap of every JVM started by the command (e.g., '4g')
+    :return: a RunResult with the exit code (None if it could not be started), whether it timed out, the tail of the
+        output, and the wall and CPU time in seconds
     """
 
-    # Create a shared value to store function return value
-    value = Value('b', False)
+    env = os.environ.copy()
+    if max_heap:
+        env['JAVA_TOOL_OPTIONS'] = f'{env.get("JAVA_TOOL_OPTIONS", "")} -Xmx{max_heap}'.strip()
+
+    cpu_start = children_cpu_time()
+    start = time.monotonic()
+    timed_out = False
+
+    with tempfile.TemporaryFile() as output:
+        try:
+            process = subprocess.Popen(command, cwd=cwd, env=env, stdin=subprocess.DEVNULL, stdout=output,
+                                       stderr=subprocess.STDOUT, start_new_session=True,
+                                       preexec_fn=set_limits(limits) if limits and any(limits.values()) else None)
+        except (OSError, subprocess.SubprocessError) as e:
+            return RunResult(None, False, str(e), 0, 0)
 
-    # create the list of arguments to pass to the target function
-    if type(args) is tuple or type(args) is list:
-        args = tuple([*args, value])
-    else:
-        args = (args, value)
-    p = Process(target=target, args=args)
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            kill_group(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                pass
+        finally:
+            # whatever is left of the tree (e.g., daemons or forked JVMs) must not keep running
+            kill_group(process.pid, signal.SIGKILL)
+            process.wait()
 
-    start = time.time()
-    p.start()
+        wall_time = time.monotonic() - start
+        cpu_time = children_cpu_time() - cpu_start
 
-    p.join(timeout=timeout)
-    p.terminate()
-    end = time.time()
+        output.seek(max(os.fstat(output.fileno()).st_size - TAIL_SIZE, 0))
+        tail = output.read().decode('utf-8', errors='replace')
 
-    return p.exitcode == 0, value.value == 1, math.ceil(end - start)
+    return RunResult(process.returncode, timed_out, tail, wall_time, cpu_time)
@@ -1,13 +1,13 @@
 import os
 import re
 import argparse
-from progress.bar import Bar
 from git import Repo
 from git.cmd import Git
 from git.exc import GitCommandError
 from utils.file_system import *
 from utils.parsing import *
 from utils.time import *
+from utils.progress_bar import ProgressBar
 from datetime import datetime
 
 timeout = 300  # seconds (= 5 minutes)
@@ -74,7 +74,7 @@ def print_time(keyword):
 
 
 def main(options):
-    start_at = print_time("Start time")
+    print_time("Start time")
     create_repos()
     create_archives()
 
@@ -97,23 +97,20 @@ def main(options):
         print(f"Analyzing block of methods: {start} to {end}")
 
     rows = df.shape[0]
-    count = 1
-    bar = Bar('Processing', max=rows)
+    bar = ProgressBar(rows)
 
     for idx, row in df.iterrows():
         repo_name, dataset = row['REPO_NAME'], row['DATASET']
         url = f'https://www.github.com/{repo_name}'
 
         save_folder = f'repo__{repo_name.replace("/", "_")}'
-        bar.suffix = f'{count}/{rows} ({float(count) / float(rows) * 100:.2f}%%) | {elapsed_time(start_at)} | {repo_name}'
+        bar.update(repo_name)
 
         if save_folder in os.listdir(repos) or f'{save_folder}.zip' in os.listdir(archives):
-            count += 1
             bar.next()
             continue
 
         if repo_name in failed_repos:
-            count += 1
             bar.next()
             df.loc[idx, 'VALID'] = False
             continue
@@ -137,7 +134,6 @@ def main(options):
             failed_repos.add(repo_name)
             df.loc[idx, 'VALID'] = False
         finally:
-            count += 1
             bar.next()
             delete_repo(save_folder)
     bar.finish()